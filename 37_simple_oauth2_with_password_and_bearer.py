@@ -1,8 +1,11 @@
+from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends, FastAPI, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from pydantic import BaseModel
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from user_repository import User, UserRepository, UserRow
 
 
 fake_users_db = {
@@ -22,8 +25,6 @@ fake_users_db = {
     },
 }
 
-app = FastAPI()
-
 
 def fake_hash_password(password: str):
     return "fakehashed" + password
@@ -32,32 +33,59 @@ def fake_hash_password(password: str):
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 
-class User(BaseModel):
-    username: str
-    email: str | None = None
-    full_name: str | None = None
-    disabled: bool | None = None
+# User, UserInDB and the users table (UserRow), seeded from fake_users_db, are in
+# user_repository.py
+
+
+# not the users.db of the next tutorial, the password hashes there are bcrypt
+sqlite_file_name = "simple_users.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+connect_args = {"check_same_thread": False}
+engine = create_engine(sqlite_url, connect_args=connect_args)
+
+
+# user repository with a read-through cache of the built UserInDB objects (user_repository.py)
 
+USER_CACHE_SIZE = 10_000
+# a change made through another worker is seen after at most this long
+USER_CACHE_TTL = 30.0  # seconds
 
-class UserInDB(User):
-    hashed_password: str
+user_repository = UserRepository(engine, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
 
-def get_user(db, username: str):
-    if username in db:
-        user_dict = db[username]
-        return UserInDB(**user_dict)
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        existing = set(session.exec(select(UserRow.username)).all())
+        for username, user_dict in fake_users_db.items():
+            if username not in existing:
+                session.add(UserRow(**user_dict))
+        session.commit()
 
 
-def fake_decode_token(token):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_db_and_tables()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def get_user(db: UserRepository, username: str):
+    return await db.get_async(username)
+
+
+async def fake_decode_token(token):
     # This doesn't provide any security at all
     # Check the next version
-    user = get_user(fake_users_db, token)
+    user = await get_user(user_repository, token)
     return user
 
 
 async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    user = fake_decode_token(token)
+    user = await fake_decode_token(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -76,12 +104,11 @@ async def get_current_active_user(
 
 
 @app.post("/token")
-async def login(form_data: Annotated(OAuth2PasswordRequestForm, Depends())):
-    user_dict = fake_users_db.get(form_data.username)
-    if not user_dict:
+async def login(form_data: Annotated[OAuth2PasswordRequestForm, Depends()]):
+    user = await get_user(user_repository, form_data.username)
+    if not user:
         raise HTTPException(status_code=400, detail="Incorrect username or password")
 
-    user = UserInDB(**user_dict)
     hashed_password = fake_hash_password(form_data.password)
 
     if not hashed_password == user.hashed_password:
@@ -1,18 +1,48 @@
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, FastAPI, HTTPException, status
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from fastapi import Depends, FastAPI, Form, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jwt.exceptions import InvalidTokenError
 from passlib.context import CryptContext
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel
+from sqlmodel import Field, Session, SQLModel, create_engine, delete, select
+
+from fast_json import FastJSONResponse
+from user_repository import User, UserRepository, UserRow
 
 # to get a string like this run:
 # openssl rand -hex 32
-SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# SECRET_KEY = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
+# ALGORITHM = "HS256"
+
+# tokens are signed with a private key, anyone can verify them with the public keys
+# from /.well-known/jwks.json. "EdDSA" (Ed25519) or "ES256" (P-256)
+ALGORITHM = "EdDSA"
+# access tokens are short-lived, clients get a new one from /token/refresh without the password
+# ACCESS_TOKEN_EXPIRE_MINUTES = 30
+ACCESS_TOKEN_EXPIRE_MINUTES = 5
+REFRESH_TOKEN_EXPIRE_DAYS = 7
+KEY_ROTATION_MINUTES = 24 * 60
+# a token with a kid this process doesn't know reloads the keys, at most once per second
+KEY_RELOAD_SECONDS = 1
 
 
 fake_users_db = {
@@ -29,28 +59,149 @@ fake_users_db = {
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: str | None = None
 
 
 class TokenData(BaseModel):
     username: str | None = None
 
 
-class User(BaseModel):
-    username: str
+class UserUpdate(BaseModel):
     email: str | None = None
     full_name: str | None = None
-    disabled: bool | None = None
 
 
-class UserInDB(User):
-    hashed_password: str
+# users table
+# fake_users_db is only the seed data now, the users live in a sqlite table with a unique index
+# on username (UserRow in user_repository.py).
+
+
+class RevokedToken(SQLModel, table=True):
+    __tablename__ = "revoked_tokens"
+
+    jti: str = Field(primary_key=True)
+    expires_at: float = Field(index=True)
+
+
+class SigningKey(SQLModel, table=True):
+    __tablename__ = "signing_keys"
+
+    kid: str = Field(primary_key=True)
+    algorithm: str
+    # PKCS8 PEM, this table has to be kept as private as the password hashes
+    private_key: str
+    created_at: float = Field(index=True)
+
+
+class BcryptCost(SQLModel, table=True):
+    __tablename__ = "bcrypt_cost"
+
+    # a single row, the rounds every worker hashes with
+    id: int = Field(default=1, primary_key=True)
+    rounds: int
+    verify_ms: float
+
+
+sqlite_file_name = "users.db"
+sqlite_url = f"sqlite:///{sqlite_file_name}"
+
+connect_args = {"check_same_thread": False}
+engine = create_engine(sqlite_url, connect_args=connect_args)
+
+
+# user repository with a read-through cache of the built UserInDB objects (user_repository.py)
+
+USER_CACHE_SIZE = 10_000
+# a change made through another worker is seen after at most this long
+USER_CACHE_TTL = 30.0  # seconds
+
+user_repository = UserRepository(engine, maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def create_db_and_tables():
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        existing = set(session.exec(select(UserRow.username)).all())
+        for username, user_dict in fake_users_db.items():
+            if username not in existing:
+                session.add(UserRow(**user_dict))
+        session.commit()
+    revocation_list.load()
+    key_ring.rotate()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    create_db_and_tables()
+    if BCRYPT_CALIBRATE:
+        calibrate_bcrypt(BCRYPT_TARGET_MS)
+    yield
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt cost calibration
+# a fixed cost factor takes 60 ms on one machine and 400 ms on another, and login capacity with it.
+# the rounds are picked so a verify takes about BCRYPT_TARGET_MS here: one hash at a low cost is
+# timed and scaled up, every round doubles the time. never below BCRYPT_MIN_ROUNDS, whatever the
+# hardware. stored hashes with another cost are rehashed on the next successful login
+# (authenticate_user).
+# the calibration runs once, the first worker to start stores the rounds in the bcrypt_cost table
+# and every worker (and every restart) uses them. calibrated per worker, two workers could land
+# one round apart and rehash the same user back and forth on every login.
+# to recalibrate, e.g. after moving to other hardware, delete the row.
+
+BCRYPT_CALIBRATE = True
+BCRYPT_TARGET_MS = 100
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+bcrypt_calibration = {"rounds": None, "verify_ms": None, "rehashed": 0}
+
+
+def measure_bcrypt(target_ms: float) -> tuple[int, float]:
+    # (rounds, expected verify ms at those rounds)
+    probe_rounds = 8
+    handler = pwd_context.handler("bcrypt").using(rounds=probe_rounds)
+    timings = []
+    for _ in range(3):
+        started = time.perf_counter()
+        handler.hash("calibration")
+        timings.append((time.perf_counter() - started) * 1000)
+    probe_ms = min(timings)
+    rounds = probe_rounds + round(math.log2(target_ms / probe_ms))
+    rounds = max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, rounds))
+    return rounds, round(probe_ms * 2 ** (rounds - probe_rounds), 1)
+
+
+def calibrate_bcrypt(target_ms: float) -> int:
+    with Session(engine) as session:
+        cost = session.get(BcryptCost, 1)
+    if cost is None:
+        rounds, verify_ms = measure_bcrypt(target_ms)
+        try:
+            with Session(engine) as session:
+                session.add(BcryptCost(rounds=rounds, verify_ms=verify_ms))
+                session.commit()
+        except IntegrityError:
+            # another worker calibrated at the same time, its rounds are used
+            pass
+        with Session(engine) as session:
+            cost = session.get(BcryptCost, 1)
+    # min and max too, so needs_update() is true for any hash with a different cost
+    pwd_context.update(
+        bcrypt__default_rounds=cost.rounds,
+        bcrypt__min_rounds=cost.rounds,
+        bcrypt__max_rounds=cost.rounds,
+    )
+    bcrypt_calibration["rounds"] = cost.rounds
+    bcrypt_calibration["verify_ms"] = cost.verify_ms
+    return cost.rounds
+
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-app = FastAPI()
+# responses are rendered by pydantic-core, see fast_json.py
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
 def verify_password(plain_password, hashed_password):
@@ -61,52 +212,550 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 
-def get_user(db, username: str):
-    if username in db:
-        user_dict = db[username]
-        return UserInDB(**user_dict)
+def verify_and_update_password(plain_password, hashed_password):
+    # (valid, new hash if the stored one should be replaced, otherwise None)
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+# hashing executor
+# bcrypt burns a few hundred ms of CPU per call. called from an async def endpoint it blocks
+# the event loop, and with it every other request. the hashing runs on its own bounded thread
+# pool instead (bcrypt releases the GIL, so the threads really run in parallel and the event loop
+# keeps serving). HASH_WORKERS limits how many hashes run at the same time, at most
+# HASH_MAX_QUEUE more wait for a worker, past that logins get a 503 right away.
+
+HASH_WORKERS = os.cpu_count() or 1
+HASH_MAX_QUEUE = 64
+
+
+class HashExecutor:
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.max_queue_depth = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="hash")
+
+    def _run(self, fn, args):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many logins in progress",
+                    headers={"Retry-After": "1"},
+                )
+            self.queued += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queued)
+        future = self._pool.submit(self._run, fn, args)
+        future.add_done_callback(self._cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _cancelled(self, future):
+        # a login that is cancelled while its job waits (the client went away) cancels the job,
+        # which then never gets to _run, so it leaves the queue here
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "running": self.running,
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queue_depth,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+
+hash_executor = HashExecutor(max_workers=HASH_WORKERS, max_queue=HASH_MAX_QUEUE)
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await hash_executor.run(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await hash_executor.run(get_password_hash, password)
+
+
+async def verify_and_update_password_async(plain_password, hashed_password):
+    return await hash_executor.run(verify_and_update_password, plain_password, hashed_password)
+
+
+# login rate limiting
+# a bad password still costs a full bcrypt verify, a few hundred attempts per second keep every
+# core busy. /token takes a token from two buckets, one per client ip and one per username,
+# before anything is hashed. an empty bucket means 429 with Retry-After. each bucket is two
+# floats in an LRU keyed by ip or username, a check is O(1) and memory is bounded by
+# LOGIN_LIMITER_SIZE (an evicted bucket starts full again).
+# request.client.host is the peer address, behind a proxy run uvicorn with --forwarded-allow-ips
+# so it's the real client.
+
+LOGIN_RATE_LIMIT = True
+LOGIN_IP_RATE = 1.0  # tokens per second
+LOGIN_IP_BURST = 20
+LOGIN_USERNAME_RATE = 5 / 60
+LOGIN_USERNAME_BURST = 5
+LOGIN_LIMITER_SIZE = 100_000
+
+
+class TokenBucketLimiter:
+    def __init__(self, rate: float, burst: float, maxsize: int):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.rejected = 0
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        # takes a token and returns 0, or returns the seconds until a token is available
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self.rejected += 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+ip_limiter = TokenBucketLimiter(LOGIN_IP_RATE, LOGIN_IP_BURST, LOGIN_LIMITER_SIZE)
+username_limiter = TokenBucketLimiter(
+    LOGIN_USERNAME_RATE, LOGIN_USERNAME_BURST, LOGIN_LIMITER_SIZE
+)
+
+
+def check_login_rate(client_ip: str, username: str):
+    wait = ip_limiter.acquire(client_ip) or username_limiter.acquire(username)
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
 
 
-def authenticate_user(fake_db, username: str, password: str):
-    user = get_user(fake_db, username)
+async def get_user(db: UserRepository, username: str):
+    return await db.get_async(username)
+
+
+async def authenticate_user(db: UserRepository, username: str, password: str):
+    user = await get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash is not None:
+        # the password is known right now, store it with the calibrated cost
+        user = await run_in_threadpool(db.update, username, {"hashed_password": new_hash})
+        bcrypt_calibration["rehashed"] += 1
     return user
 
 
-def create_access_token(data: dict, expires_delta: timedelta | None = None):
+# signing keys
+# the key ring holds the current private key and the public keys, by kid, that tokens may still be
+# signed with. every token carries the kid of its key in the header. after KEY_ROTATION_MINUTES
+# a new key is generated, the old public key stays in the ring (and in the jwks) for as long as
+# a token signed with it can live, then it is dropped.
+# the keys are stored in the signing_keys table, so a restart keeps them and every worker signs
+# and verifies with the same set: at startup the ring loads the table and only generates a key
+# when there is none (or the newest is due for rotation), a rotation adds a row. a worker that
+# gets a token with a kid it doesn't know (a key another worker rotated in) loads the table
+# again, at most every KEY_RELOAD_SECONDS so tokens with made-up kids can't cost a query each.
+# other services verify tokens without the private key and without calling this one for every
+# token, with the jwks client from pyjwt, which caches the keys by kid:
+#   jwks_client = jwt.PyJWKClient("https://auth.example.com/.well-known/jwks.json", lifespan=300)
+#   key = jwks_client.get_signing_key_from_jwt(token)
+#   payload = jwt.decode(token, key, algorithms=["EdDSA", "ES256"])
+
+def generate_private_key(algorithm: str):
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Unsupported signing algorithm: {algorithm}")
+
+
+def jwk_thumbprint(jwk: dict) -> str:
+    # RFC 7638, the hash of the required members of the key, used as the kid
+    required = {"OKP": ("crv", "kty", "x"), "EC": ("crv", "kty", "x", "y")}[jwk["kty"]]
+    members = json.dumps({name: jwk[name] for name in required}, separators=(",", ":"))
+    digest = hashlib.sha256(members.encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+
+class KeyRing:
+    def __init__(
+        self,
+        engine,
+        algorithm: str,
+        rotate_after: timedelta,
+        keep_for: timedelta,
+        reload_after: timedelta,
+    ):
+        self.engine = engine
+        self.algorithm = algorithm
+        self.rotate_after = rotate_after.total_seconds()
+        self.keep_for = keep_for.total_seconds()
+        self.reload_after = reload_after.total_seconds()
+        self.kid = None
+        self.private_key = None
+        self.created_at = 0.0
+        self.loaded_at = 0.0
+        # kid -> (public key, jwk, retired at)
+        self.public_keys: dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _public_entry(self, private_key, kid: str | None = None) -> tuple[str, object, dict]:
+        public_key = private_key.public_key()
+        jwk = jwt.get_algorithm_by_name(self.algorithm).to_jwk(public_key, as_dict=True)
+        kid = kid or jwk_thumbprint(jwk)
+        jwk.update({"kid": kid, "use": "sig", "alg": self.algorithm})
+        return kid, public_key, jwk
+
+    def load(self):
+        now = time.time()
+        with Session(self.engine, expire_on_commit=False) as session:
+            rows = session.exec(
+                select(SigningKey)
+                .where(SigningKey.algorithm == self.algorithm)
+                .order_by(SigningKey.created_at)
+            ).all()
+            # a key is retired when the next one is created
+            retired = [row.created_at for row in rows[1:]] + [None]
+            expired = [
+                row.kid
+                for row, retired_at in zip(rows, retired)
+                if retired_at is not None and now - retired_at >= self.keep_for
+            ]
+            if expired:
+                session.exec(delete(SigningKey).where(SigningKey.kid.in_(expired)))
+                session.commit()
+        public_keys = {}
+        for row, retired_at in zip(rows, retired):
+            if row.kid in expired:
+                continue
+            # keys this process already has aren't parsed again
+            known = self.public_keys.get(row.kid)
+            if known is None:
+                _, public_key, jwk = self._public_entry(self._private_key(row), row.kid)
+                known = (public_key, jwk, None)
+            public_keys[row.kid] = (known[0], known[1], retired_at)
+        newest = rows[-1] if rows else None
+        with self._lock:
+            self.public_keys = public_keys
+            self.loaded_at = now
+            if newest is not None and newest.kid != self.kid:
+                self.kid, self.private_key = newest.kid, self._private_key(newest)
+                self.created_at = newest.created_at
+
+    def _private_key(self, row: SigningKey):
+        return serialization.load_pem_private_key(row.private_key.encode(), password=None)
+
+    def rotation_due(self) -> bool:
+        return self.kid is None or time.time() - self.created_at >= self.rotate_after
+
+    def reload_due(self) -> bool:
+        return time.time() - self.loaded_at >= self.reload_after
+
+    def rotate(self):
+        # another worker may have rotated already, its key is used then
+        self.load()
+        if not self.rotation_due():
+            return
+        private_key = generate_private_key(self.algorithm)
+        kid, _, _ = self._public_entry(private_key)
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        with Session(self.engine) as session:
+            session.add(
+                SigningKey(
+                    kid=kid, algorithm=self.algorithm, private_key=pem.decode(), created_at=time.time()
+                )
+            )
+            session.commit()
+        self.load()
+
+    def signing_key(self):
+        if self.kid is None:
+            self.rotate()
+        return self.kid, self.private_key
+
+    def public_key(self, kid: str | None):
+        entry = self.public_keys.get(kid)
+        return entry[0] if entry is not None else None
+
+    def jwks(self) -> dict:
+        return {"keys": [jwk for _, jwk, _ in self.public_keys.values()]}
+
+
+key_ring = KeyRing(
+    engine,
+    ALGORITHM,
+    rotate_after=timedelta(minutes=KEY_ROTATION_MINUTES),
+    keep_for=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    reload_after=timedelta(seconds=KEY_RELOAD_SECONDS),
+)
+
+
+def create_access_token(
+    data: dict, expires_delta: timedelta | None = None, token_type: str = "access"
+):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # every token gets an id, that's what a revocation refers to
+    to_encode.update({"exp": expire, "jti": secrets.token_urlsafe(16), "type": token_type})
+    kid, private_key = key_ring.signing_key()
+    encoded_jwt = jwt.encode(
+        to_encode, private_key, algorithm=key_ring.algorithm, headers={"kid": kid}
+    )
     return encoded_jwt
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
-    credentials_exception = HTTPException(
+# verified token cache
+# every request with a bearer token runs jwt.decode (signature check + json parsing) and builds
+# a TokenData. the same token is sent again and again until it expires, so the username it
+# resolved to (and the token's jti) is cached, keyed by a hash of the token (the tokens themselves
+# are not kept around), until the token's exp. the user itself comes from the user repository, so a disabled
+# or updated user is seen on the next request.
+# everything here runs on the event loop (async def), so no lock is needed.
+
+TOKEN_CACHE_SIZE = 10_000
+
+
+class TokenCache:
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[bytes, tuple[float, tuple[str, str]]] = OrderedDict()
+
+    def get(self, key: bytes) -> tuple[str, str] | None:
+        item = self._data.get(key)
+        if item is not None:
+            expires_at, claims = item
+            if expires_at > time.time():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return claims
+            del self._data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: bytes, expires_at: float, claims: tuple[str, str]):
+        self._data[key] = (expires_at, claims)
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+# revoked tokens
+# a revoked token is stored by jti in the revoked_tokens table until it would have expired anyway.
+# every authenticated request has to check its jti, and nearly all of them are not revoked, so
+# a Bloom filter over the revoked jtis answers first: "no" is certain and costs a few bit
+# lookups, only a "maybe" goes to the table. the filter is built from the table at startup and
+# rebuilt with twice the capacity when it fills up (that also drops expired jtis).
+# like the caches, the filter is per process, a revocation made by another worker process is only
+# seen after a restart.
+# the filter is (size, hashes, bits) in one tuple: a rebuild makes a new one and swaps it in, a
+# check reads the tuple once, so it never pairs a new size with the old bits or sees the new
+# bitmap before the jtis are back in it.
+# refresh tokens are single use, so the refresh path doesn't trust the filter: it claims the jti
+# with a plain INSERT, the primary key lets exactly one request (of any worker) win, the others get
+# an IntegrityError and a 401.
+
+REVOCATION_CAPACITY = 100_000
+REVOCATION_ERROR_RATE = 0.001
+
+
+class RevocationList:
+    def __init__(self, engine, capacity: int, error_rate: float):
+        self.engine = engine
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.checks = 0
+        self.maybe = 0
+        self.revoked = 0
+        self._lock = threading.Lock()
+        self._filter = self._build([])
+        self.count = 0
+
+    def _build(self, jtis) -> tuple[int, int, bytearray]:
+        size = math.ceil(-self.capacity * math.log(self.error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(size / self.capacity * math.log(2)))
+        bloom = (size, hashes, bytearray((size + 7) // 8))
+        for jti in jtis:
+            self._add(bloom, jti)
+        return bloom
+
+    def _hashes(self, jti: str) -> tuple[int, int]:
+        # double hashing on the str hash, which python caches on the (token cache's) jti string
+        h = hash(jti)
+        return h & 0xFFFF_FFFF, (h >> 32 & 0xFFFF_FFFF) | 1
+
+    def _add(self, bloom: tuple[int, int, bytearray], jti: str):
+        size, hashes, bits = bloom
+        h1, h2 = self._hashes(jti)
+        for i in range(hashes):
+            index = (h1 + i * h2) % size
+            bits[index >> 3] |= 1 << (index & 7)
+
+    def load(self):
+        now = time.time()
+        # held from the read to the swap: a revoke that commits after the read waits, and adds
+        # its jti to the new filter
+        with self._lock:
+            with Session(self.engine) as session:
+                session.exec(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+                session.commit()
+                jtis = session.exec(select(RevokedToken.jti)).all()
+            while len(jtis) > self.capacity:
+                self.capacity *= 2
+            self._filter = self._build(jtis)
+            self.count = len(jtis)
+
+    def revoke(self, jti: str, expires_at: float) -> bool:
+        # True when this call revoked it, False when it already was
+        try:
+            with Session(self.engine) as session:
+                session.add(RevokedToken(jti=jti, expires_at=expires_at))
+                session.commit()
+        except IntegrityError:
+            return False
+        with self._lock:
+            self.revoked += 1
+            self.count += 1
+            self._add(self._filter, jti)
+        if self.count > self.capacity:
+            self.load()
+        return True
+
+    def _maybe_revoked(self, jti: str) -> bool:
+        self.checks += 1
+        h1, h2 = self._hashes(jti)
+        size, hashes, bits = self._filter
+        # stops at the first unset bit, for a jti that isn't revoked that's usually the first one
+        for i in range(hashes):
+            index = (h1 + i * h2) % size
+            if not bits[index >> 3] >> (index & 7) & 1:
+                return False
+        self.maybe += 1
+        return True
+
+    def _in_table(self, jti: str) -> bool:
+        with Session(self.engine) as session:
+            return session.get(RevokedToken, jti) is not None
+
+    def is_revoked(self, jti: str) -> bool:
+        return self._maybe_revoked(jti) and self._in_table(jti)
+
+    async def is_revoked_async(self, jti: str) -> bool:
+        # the filter check stays on the event loop, only a "maybe" queries the table, in the threadpool
+        return self._maybe_revoked(jti) and await run_in_threadpool(self._in_table, jti)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "count": self.count,
+            "filter_bytes": len(self._filter[2]),
+            "hashes": self._filter[1],
+            "checks": self.checks,
+            "table_lookups": self.maybe,
+            "revoked": self.revoked,
+        }
+
+
+revocation_list = RevocationList(
+    engine, capacity=REVOCATION_CAPACITY, error_rate=REVOCATION_ERROR_RATE
+)
+
+
+token_cache = TokenCache(maxsize=TOKEN_CACHE_SIZE)
+auth_stats = {"requests": 0, "seconds": 0.0}
+
+
+def credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except InvalidTokenError:
-        raise credentials_exception
-    user = get_user(fake_users_db, username=token_data.username)
+
+
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
+    started = time.perf_counter()
+    key = hashlib.sha256(token.encode()).digest()
+    claims = token_cache.get(key)
+    if claims is None:
+        payload = await verify_token(token, "access")
+        claims = payload["sub"], payload["jti"]
+        token_cache.put(key, payload["exp"], claims)
+    username, jti = claims
+    if await revocation_list.is_revoked_async(jti):
+        raise credentials_exception()
+    user = await get_user(user_repository, username=username)
     if user is None:
-        raise credentials_exception
+        raise credentials_exception()
+    auth_stats["requests"] += 1
+    auth_stats["seconds"] += time.perf_counter() - started
     return user
 
 
+async def verify_token(token: str, token_type: str | None) -> dict:
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+        public_key = key_ring.public_key(kid)
+        if public_key is None and key_ring.reload_due():
+            # maybe a key another worker rotated in
+            await run_in_threadpool(key_ring.load)
+            public_key = key_ring.public_key(kid)
+        if public_key is None:
+            raise credentials_exception()
+        # exp is required, the cache entry expires with it, jti for revocation
+        payload = jwt.decode(
+            token,
+            public_key,
+            algorithms=[key_ring.algorithm],
+            options={"require": ["exp", "jti", "sub"]},
+        )
+        # a refresh token is not accepted as an access token and the other way around
+        if token_type is not None and payload.get("type") != token_type:
+            raise credentials_exception()
+    except InvalidTokenError:
+        raise credentials_exception()
+    return payload
+
+
 async def get_current_active_user(
     current_user: Annotated[User, Depends(get_current_user)],
 ):
@@ -118,19 +767,95 @@ async def get_current_active_user(
 @app.post("/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
+    request: Request,
 ) -> Token:
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    if LOGIN_RATE_LIMIT:
+        client_ip = request.client.host if request.client else "unknown"
+        check_login_rate(client_ip, form_data.username)
+    user = await authenticate_user(user_repository, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    return await issue_tokens(user.username)
+
+
+async def issue_tokens(username: str) -> Token:
+    if key_ring.rotation_due():
+        await run_in_threadpool(key_ring.rotate)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+    refresh_token = create_access_token(
+        data={"sub": username},
+        expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        token_type="refresh",
     )
-    return Token(access_token=access_token, token_type="bearer")
+    return Token(access_token=access_token, token_type="bearer", refresh_token=refresh_token)
+
+
+@app.post("/token/refresh")
+async def refresh_access_token(refresh_token: Annotated[str, Form()]) -> Token:
+    # no password and no bcrypt here, the signed refresh token is the proof
+    payload = await verify_token(refresh_token, "refresh")
+    user = await get_user(user_repository, username=payload["sub"])
+    if user is None or user.disabled:
+        raise credentials_exception()
+    # refresh tokens are single use, the one exchanged here is revoked. only the request that
+    # revokes it gets new tokens, the table decides, not the filter of this process
+    if not await run_in_threadpool(revocation_list.revoke, payload["jti"], payload["exp"]):
+        raise credentials_exception()
+    return await issue_tokens(user.username)
+
+
+@app.post("/token/revoke")
+async def revoke_token(token: Annotated[str, Form()]):
+    # like RFC 7009, an invalid or already expired token is not an error
+    try:
+        payload = await verify_token(token, None)
+    except HTTPException:
+        return {"ok": True}
+    await run_in_threadpool(revocation_list.revoke, payload["jti"], payload["exp"])
+    return {"ok": True}
+
+
+@app.get("/.well-known/jwks.json")
+async def read_jwks(response: Response):
+    # verifiers can cache the key set, PyJWKClient fetches it again when it sees a kid it
+    # doesn't know yet (a token signed after a rotation)
+    response.headers["Cache-Control"] = "public, max-age=300"
+    # the keys other workers rotated in are published too
+    if key_ring.reload_due():
+        await run_in_threadpool(key_ring.load)
+    return key_ring.jwks()
+
+
+@app.get("/auth/stats")
+async def read_auth_stats():
+    lookups = token_cache.hits + token_cache.misses
+    requests = auth_stats["requests"]
+    return {
+        "token_cache_size": len(token_cache._data),
+        "token_cache_hits": token_cache.hits,
+        "token_cache_misses": token_cache.misses,
+        "token_cache_hit_rate": token_cache.hits / lookups if lookups else 0.0,
+        "auth_requests": requests,
+        "auth_avg_us": auth_stats["seconds"] / requests * 1e6 if requests else 0.0,
+        "user_cache_hits": user_repository.hits,
+        "user_cache_misses": user_repository.misses,
+        "hash_executor": hash_executor.stats(),
+        "bcrypt": bcrypt_calibration,
+        "revocation_list": revocation_list.stats(),
+        # a login is checked against the username bucket only when the ip bucket let it through,
+        # so every rejected attempt is counted once. not every one is a bcrypt verify avoided,
+        # an unknown username never gets to the hash
+        "login_rejected_ip": ip_limiter.rejected,
+        "login_rejected_username": username_limiter.rejected,
+        "rejected_attempts": ip_limiter.rejected + username_limiter.rejected,
+    }
 
 
 @app.get("/users/me/", response_model=User)
@@ -140,6 +865,16 @@ async def read_users_me(
     return current_user
 
 
+@app.patch("/users/me/", response_model=User)
+async def update_users_me(
+    current_user: Annotated[User, Depends(get_current_active_user)],
+    user: UserUpdate,
+):
+    return await run_in_threadpool(
+        user_repository.update, current_user.username, user.model_dump(exclude_unset=True)
+    )
+
+
 @app.get("/users/me/items/")
 async def read_own_items(
     current_user: Annotated[User, Depends(get_current_active_user)],
@@ -1,8 +1,36 @@
+from collections import OrderedDict
+from concurrent.futures import Future
 from contextlib import asynccontextmanager
-from typing import Annotated
-
-from fastapi import FastAPI, Depends, HTTPException, Query
-from sqlmodel import Field, Session, SQLModel, create_engine, select
+from itertools import groupby
+import csv
+import hashlib
+import io
+import json
+import queue
+import threading
+import time
+from typing import Annotated, Any, Literal
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import column, event, inspect, table
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import (
+    Field,
+    Session,
+    SQLModel,
+    create_engine,
+    delete,
+    insert,
+    select,
+    update,
+)
+
+from fast_json import FastJSONResponse, RowSerializer
+from hero_cursor import HeroOrder, encode_cursor, select_heroes_after
+from hero_migrations import upgrade_hero_table
 
 
 # class Hero(SQLModel, table=True):
@@ -18,8 +46,13 @@ class HeroBase(SQLModel):
 
 
 class Hero(HeroBase, table=True):
+    # AUTOINCREMENT, so the id of a deleted hero is never given out again (the etags rely on it)
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: int | None = Field(default=None, primary_key=True)
     secret_name: str
+    # bumped on every update
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
 
 
 class HeroPublic(HeroBase):
@@ -42,11 +75,84 @@ class HeroUpdate(HeroBase):
     secret_name: str | None = None
 
 
+class HeroBulkError(SQLModel):
+    index: int  # position of the row in the request body
+    detail: Any
+
+
+class HeroBulkResult(SQLModel):
+    inserted: int
+    errors: list[HeroBulkError] = []
+
+
 sqlite_file_name = "database.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
+
+
+# sqlite engine profile
+# by default sqlite uses a rollback journal, so every write blocks all the readers.
+# in WAL mode readers keep reading the last committed data while a write is going on.
+# writes and reads get separate pools, and the read connections are query_only.
+# sqlite still only allows one writer at a time, the other writers wait up to busy_timeout.
+
+
+class SQLiteProfile(BaseModel):
+    journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"] = "WAL"
+    synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    mmap_size: int = 256 * 1024 * 1024  # bytes
+    cache_size: int = -64 * 1024  # negative values are KiB instead of pages
+    busy_timeout: int = 5000  # milliseconds
+    # number of connections each pool keeps open, extra ones are opened when needed.
+    # the pools can't have a hard limit: a session keeps its connection until the response is
+    # serialized, which needs a thread from the same threadpool the waiting endpoints hold.
+    reader_pool_size: int = 40
+    writer_pool_size: int = 5
+
+
+# set to None to get the default sqlite settings and a single shared pool
+sqlite_profile: SQLiteProfile | None = SQLiteProfile()
+
+
+def set_sqlite_pragmas(engine, profile: SQLiteProfile, query_only: bool = False):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not query_only:
+            # the journal mode is stored in the database file, the other pragmas are per connection
+            cursor.execute(f"PRAGMA journal_mode={profile.journal_mode}")
+        cursor.execute(f"PRAGMA synchronous={profile.synchronous}")
+        cursor.execute(f"PRAGMA mmap_size={profile.mmap_size:d}")
+        cursor.execute(f"PRAGMA cache_size={profile.cache_size:d}")
+        cursor.execute(f"PRAGMA busy_timeout={profile.busy_timeout:d}")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def create_engines(url: str, profile: SQLiteProfile | None):
+    if profile is None:
+        engine = create_engine(url, connect_args=connect_args)
+        return engine, engine
+    engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=profile.writer_pool_size,
+        max_overflow=-1,
+    )
+    read_engine = create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=profile.reader_pool_size,
+        max_overflow=-1,
+    )
+    set_sqlite_pragmas(engine, profile)
+    set_sqlite_pragmas(read_engine, profile, query_only=True)
+    return engine, read_engine
+
+
+engine, read_engine = create_engines(sqlite_url, sqlite_profile)
 
 
 def get_session():
@@ -54,17 +160,26 @@ def get_session():
         yield session
 
 
+def get_read_session():
+    with Session(read_engine) as session:
+        yield session
+
+
 SessionDep = Annotated[Session, Depends(get_session)]
+ReadSessionDep = Annotated[Session, Depends(get_read_session)]
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
     yield
+    if group_committer is not None:
+        group_committer.close()
     print("shutting down")
 
 
-app = FastAPI(lifespan=lifespan)
+# responses are rendered by pydantic-core, see fast_json.py
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 
 # Deprecated
@@ -76,6 +191,186 @@ app = FastAPI(lifespan=lifespan)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # databases created before Hero had AUTOINCREMENT and a version column
+        upgrade_hero_table(conn, Hero.__table__)
+        create_hero_fts(conn)
+
+
+# etags
+# every hero has a version that goes up on each update, so "<id>.<version>" is a strong etag
+# that can be checked without serializing the hero again.
+# If-None-Match on a GET is answered with 304 Not Modified and no body.
+# If-Match on PATCH/DELETE makes the write conditional: it only happens if the hero still has
+# the version the client saw, otherwise 412 Precondition Failed (optimistic concurrency).
+
+
+def hero_etag(hero_id: int, version: int) -> str:
+    return f'"{hero_id}.{version}"'
+
+
+def etag_in(etag: str, header: str | None) -> bool:
+    # If-None-Match uses the weak comparison, W/"x" matches "x"
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def if_match_versions(hero_id: int, if_match: str | None) -> list[int] | None:
+    # None means there is no precondition to check
+    if if_match is None or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        # If-Match uses the strong comparison, weak etags never match
+        if not (len(tag) > 2 and tag.startswith('"') and tag.endswith('"')):
+            continue
+        tag_hero_id, _, version = tag[1:-1].partition(".")
+        if tag_hero_id == str(hero_id) and version.isdigit():
+            versions.append(int(version))
+    return versions
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def precondition_failed():
+    return HTTPException(status_code=412, detail="Hero has been modified")
+
+
+# group commit
+# every write commits its own transaction, and each commit has to wait for the disk.
+# in group commit mode concurrent writes are queued for a moment (at most GROUP_COMMIT_WINDOW
+# seconds and GROUP_COMMIT_MAX_BATCH writes), then one writer thread runs all of them in a
+# single transaction, so they share one commit.
+# the writer thread is the bottleneck then, so it does as little as it can per write: inserts
+# (BulkInsert) that come one after the other in the batch go to the database as one executemany,
+# and nothing else is done per write. only when a write fails is the batch rolled back and run
+# again with a savepoint around every write: the failed write is rolled back on its own and only
+# its caller gets the error.
+
+GROUP_COMMIT = False
+GROUP_COMMIT_WINDOW = 0.002  # seconds
+GROUP_COMMIT_MAX_BATCH = 64
+
+
+class BulkInsert:
+    # a write that inserts one row with statement (an INSERT ... RETURNING), the group committer
+    # runs the ones next to each other in a batch as one executemany
+    def __init__(self, statement, values: dict):
+        self.statement = statement
+        self.values = values
+
+    def __call__(self, session: Session):
+        return session.connection().execute(self.statement, self.values).mappings().one()
+
+
+class GroupCommitter:
+    def __init__(self, engine, window: float, max_batch: int):
+        self.engine = engine
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.writes = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, write):
+        # write(session) runs on the writer thread, its return value (or exception) comes back here
+        future = Future()
+        self._queue.put((write, future))
+        return future.result()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    # close() was called, commit what is already queued and stop after it
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        try:
+            try:
+                results = self._write(batch, savepoints=False)
+            except Exception:
+                results = self._write(batch, savepoints=True)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for (_, future), (result, error) in zip(batch, results):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _write(self, batch, savepoints: bool) -> list[tuple[Any, Exception | None]]:
+        # all the writes in one transaction, (result, error) for every write.
+        # without savepoints the first failing write raises and rolls back the whole batch
+        results = []
+        with Session(self.engine) as session:
+            # take the write lock right away, everything below goes in this one transaction
+            session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+            if savepoints:
+                for write, _ in batch:
+                    try:
+                        with session.begin_nested():
+                            results.append((write(session), None))
+                    except Exception as e:
+                        results.append((None, e))
+            else:
+                # runs of inserts with the same statement, every other write on its own
+                runs = groupby(batch, key=lambda item: getattr(item[0], "statement", item))
+                for statement, run in runs:
+                    writes = [write for write, _ in run]
+                    if isinstance(writes[0], BulkInsert):
+                        rows = session.connection().execute(
+                            statement, [write.values for write in writes]
+                        )
+                        results += [(row, None) for row in rows.mappings().all()]
+                    else:
+                        results += [(write(session), None) for write in writes]
+            session.commit()
+        return results
+
+
+group_committer = (
+    GroupCommitter(engine, GROUP_COMMIT_WINDOW, GROUP_COMMIT_MAX_BATCH) if GROUP_COMMIT else None
+)
+
+
+def commit_write(session: Session, write):
+    if group_committer is not None:
+        return group_committer.submit(write)
+    result = write(session)
+    session.commit()
+    return result
 
 
 # @app.post("/heroes/")
@@ -86,13 +381,117 @@ def create_db_and_tables():
 #     return hero
 
 
+# @app.post("/heroes/")
+# def create_hero(hero: HeroCreate, session: SessionDep):
+#     db_hero = Hero.model_validate(hero)
+#     session.add(db_hero)
+#     session.commit()
+#     session.refresh(db_hero)
+#     return db_hero
+
+
+# INSERT ... RETURNING (sqlite >= 3.35)
+# session.refresh() after the commit runs one more SELECT just to read back the id and the columns.
+# RETURNING hands back the written row from the INSERT/UPDATE statement itself.
+
+hero_columns = list(Hero.__table__.columns)
+
+
+# in group commit mode the inserts of a batch are one executemany, the rows come back in order
+insert_hero_statement = insert(Hero).returning(*hero_columns, sort_by_parameter_order=True)
+
+
 @app.post("/heroes/")
-def create_hero(hero: HeroCreate, session: SessionDep):
-    db_hero = Hero.model_validate(hero)
-    session.add(db_hero)
-    session.commit()
-    session.refresh(db_hero)
-    return db_hero
+def create_hero(hero: HeroCreate, session: SessionDep, response: Response):
+    row = commit_write(session, BulkInsert(insert_hero_statement, hero.model_dump()))
+    response.headers["ETag"] = hero_etag(row["id"], row["version"])
+    return Hero.model_validate(row)
+
+
+# bulk ingest
+# create_hero does add + commit + refresh for every row, one request per hero.
+# /heroes/bulk takes a json array, or a streamed NDJSON body (one HeroCreate per line),
+# validates the rows in chunks and writes each chunk with one executemany in one transaction.
+# rows that fail are reported by index and the rest of the batch still goes in.
+
+BULK_CHUNK_SIZE = 1000
+
+
+def insert_hero_rows(rows: list[tuple[int, dict]]) -> list[HeroBulkError]:
+    errors = []
+    with Session(engine) as session:
+        try:
+            session.connection().execute(insert(Hero), [row for _, row in rows])
+            session.commit()
+            return errors
+        except IntegrityError:
+            session.rollback()
+        # the chunk was rejected as a whole, retry it row by row to find the bad ones.
+        # pysqlite only begins a transaction before an INSERT, a SAVEPOINT outside of one would
+        # make every RELEASE a commit, so the transaction is begun here (like GroupCommitter._write)
+        session.connection().exec_driver_sql("BEGIN IMMEDIATE")
+        for index, row in rows:
+            try:
+                with session.begin_nested():
+                    session.connection().execute(insert(Hero), row)
+            except IntegrityError as e:
+                errors.append(HeroBulkError(index=index, detail=str(e.orig)))
+        session.commit()
+    return errors
+
+
+async def iter_bulk_rows(request: Request):
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith(("application/x-ndjson", "application/jsonl")):
+        index = 0
+        buffer = b""
+        async for data in request.stream():
+            buffer += data
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+    else:
+        try:
+            body = await request.json()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(body, list):
+            raise HTTPException(status_code=422, detail="Expected a JSON array of heroes")
+        for index, item in enumerate(body):
+            yield index, item
+
+
+@app.post("/heroes/bulk", response_model=HeroBulkResult)
+async def create_heroes_bulk(request: Request):
+    result = HeroBulkResult(inserted=0)
+    chunk = []
+
+    async def flush():
+        errors = await run_in_threadpool(insert_hero_rows, chunk)
+        result.inserted += len(chunk) - len(errors)
+        result.errors.extend(errors)
+        chunk.clear()
+
+    async for index, item in iter_bulk_rows(request):
+        try:
+            if isinstance(item, bytes):
+                hero = HeroCreate.model_validate_json(item)
+            else:
+                hero = HeroCreate.model_validate(item)
+        except ValidationError as e:
+            detail = e.errors(include_url=False, include_context=False, include_input=False)
+            result.errors.append(HeroBulkError(index=index, detail=detail))
+            continue
+        chunk.append((index, hero.model_dump()))
+        if len(chunk) >= BULK_CHUNK_SIZE:
+            await flush()
+    if chunk:
+        await flush()
+    return result
 
 
 # @app.get("/heroes/")
@@ -105,14 +504,179 @@ def create_hero(hero: HeroCreate, session: SessionDep):
 #     return heroes
 
 
+# the heroes go to json in one pass, see RowSerializer in fast_json.py
+hero_rows = RowSerializer(HeroPublic)
+
+
 @app.get("/heroes/", response_model=list[HeroPublic])
 def read_heroes(
-    session: SessionDep,
+    session: ReadSessionDep,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
+    order_by: HeroOrder = "id",
+    after: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+):
+    # keyset (cursor) pagination, see hero_cursor.py
+    heroes = []
+    for statement in select_heroes_after(Hero, order_by, after):
+        if after is None:
+            statement = statement.offset(offset)
+        heroes += session.exec(statement.limit(limit - len(heroes))).all()
+        if len(heroes) == limit:
+            break
+
+    # the page is made of these heroes at these versions, hash that instead of the json
+    page = hashlib.blake2b(digest_size=16)
+    for hero in heroes:
+        page.update(f"{hero.id}.{hero.version},".encode())
+    etag = f'"{page.hexdigest()}"'
+    if etag_in(etag, if_none_match):
+        return not_modified(etag)
+
+    headers = {"ETag": etag}
+    if heroes and len(heroes) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(order_by, heroes[-1])
+    return Response(
+        content=hero_rows.dump_json(heroes), media_type="application/json", headers=headers
+    )
+
+
+# streaming export
+# read_heroes builds the whole list[HeroPublic] in memory, and is capped at 100 rows per page.
+# /heroes/export streams the table instead: the query is iterated with yield_per, so only one
+# batch of rows is held at a time, and every batch is written out as soon as it is fetched.
+# it has to be declared before /heroes/{hero_id}, otherwise "export" is matched as a hero_id.
+
+EXPORT_BATCH_SIZE = 1000
+export_columns = list(HeroPublic.model_fields)
+
+
+def iter_export_batches():
+    # the session is opened here and not through SessionDep, so it stays open while the response streams
+    with Session(read_engine) as session:
+        statement = select(*(getattr(Hero, name) for name in export_columns)).order_by(Hero.id)
+        result = session.exec(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        yield from result.partitions()
+
+
+def export_heroes_ndjson():
+    for rows in iter_export_batches():
+        yield "".join(json.dumps(dict(zip(export_columns, row))) + "\n" for row in rows)
+
+
+def export_heroes_csv():
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(export_columns)
+    yield buffer.getvalue()
+    for rows in iter_export_batches():
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+@app.get("/heroes/export")
+def export_heroes(accept: Annotated[str, Header()] = "application/x-ndjson"):
+    if "text/csv" in accept:
+        return StreamingResponse(export_heroes_csv(), media_type="text/csv")
+    return StreamingResponse(export_heroes_ndjson(), media_type="application/x-ndjson")
+
+
+# search
+# name and age have indexes, so a name prefix is turned into a range on the name index
+# (name >= 'Spi' AND name < 'Spj') and an age range into a range on the age index.
+# for searching words in name/secret_name there is an FTS5 full-text index, hero_fts.
+# it is an external content table (it stores no copy of the rows) and the triggers keep it
+# in sync with every insert, update and delete, whichever endpoint does them.
+
+hero_fts_ddl = [
+    """CREATE VIRTUAL TABLE hero_fts USING fts5(
+        name, secret_name, content='hero', content_rowid='id'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS hero_fts_insert AFTER INSERT ON hero BEGIN
+        INSERT INTO hero_fts (rowid, name, secret_name)
+        VALUES (new.id, new.name, new.secret_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS hero_fts_delete AFTER DELETE ON hero BEGIN
+        INSERT INTO hero_fts (hero_fts, rowid, name, secret_name)
+        VALUES ('delete', old.id, old.name, old.secret_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS hero_fts_update AFTER UPDATE OF name, secret_name ON hero BEGIN
+        INSERT INTO hero_fts (hero_fts, rowid, name, secret_name)
+        VALUES ('delete', old.id, old.name, old.secret_name);
+        INSERT INTO hero_fts (rowid, name, secret_name)
+        VALUES (new.id, new.name, new.secret_name);
+    END""",
+]
+
+hero_fts = table("hero_fts", column("rowid"), column("hero_fts"), column("rank"))
+
+
+def create_hero_fts(conn):
+    if inspect(conn).has_table("hero_fts"):
+        return
+    for ddl in hero_fts_ddl:
+        conn.exec_driver_sql(ddl)
+    # index the heroes that were already in the table
+    conn.exec_driver_sql("INSERT INTO hero_fts (hero_fts) VALUES ('rebuild')")
+
+
+def prefix_upper_bound(prefix: str) -> str | None:
+    # the smallest string after every string that starts with prefix, None when there is none.
+    # the last character can't be incremented past U+10FFFF, so those are dropped first:
+    # 'a\U0010ffff' -> 'b', and a prefix of only U+10FFFF has no upper bound.
+    # surrogates can't be sent to sqlite (it compares utf-8 bytes), U+D7FF is followed by U+E000
+    stripped = prefix.rstrip(chr(0x10FFFF))
+    if not stripped:
+        return None
+    code = ord(stripped[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return stripped[:-1] + chr(code)
+
+
+def fts_query(q: str) -> str:
+    # quote every word, so the user input is never parsed as fts5 query syntax
+    return " ".join('"' + word.replace('"', '""') + '"' for word in q.split())
+
+
+@app.get("/heroes/search", response_model=list[HeroPublic])
+def search_heroes(
+    session: ReadSessionDep,
+    q: str | None = None,
+    name_prefix: str | None = None,
+    min_age: int | None = None,
+    max_age: int | None = None,
+    rank: bool = False,
+    limit: Annotated[int, Query(le=100)] = 100,
 ):
-    heroes = session.exec(select(Hero).offset(offset).limit(limit)).all()
-    return heroes
+    statement = select(Hero)
+    if name_prefix:
+        statement = statement.where(Hero.name >= name_prefix)
+        next_prefix = prefix_upper_bound(name_prefix)
+        if next_prefix is not None:
+            statement = statement.where(Hero.name < next_prefix)
+    if min_age is not None:
+        statement = statement.where(Hero.age >= min_age)
+    if max_age is not None:
+        statement = statement.where(Hero.age <= max_age)
+
+    if q and q.split():
+        statement = statement.join(hero_fts, hero_fts.c.rowid == Hero.id)
+        statement = statement.where(hero_fts.c.hero_fts.op("MATCH")(fts_query(q)))
+        # in rowid order fts5 can stop after `limit` matches, ranking has to score every match first,
+        # which takes a few hundred ms on a million heroes when the words are common
+        statement = statement.order_by(hero_fts.c.rank if rank else hero_fts.c.rowid)
+    elif name_prefix:
+        statement = statement.order_by(Hero.name, Hero.id)
+    elif min_age is not None or max_age is not None:
+        statement = statement.order_by(Hero.age, Hero.id)
+    else:
+        statement = statement.order_by(Hero.id)
+    heroes = session.exec(statement.limit(limit)).all()
+    return Response(content=hero_rows.dump_json(heroes), media_type="application/json")
 
 
 # @app.get("/heroes/{hero_id}")
@@ -123,32 +687,161 @@ def read_heroes(
 #     return hero
 
 
+# read-through cache
+# most of the traffic is reads of the same few heroes, so read_hero keeps the serialized
+# HeroPublic json in an in-process LRU cache with a TTL. a hit doesn't open a session at all.
+# update_hero and delete_hero invalidate the hero they changed.
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bumped by every invalidate(), see put()
+        self.generation = 0
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation: int):
+        with self._lock:
+            # something was invalidated while the value was being loaded, so it might already be stale
+            if generation != self.generation or self.maxsize <= 0:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self.generation += 1
+            self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+HERO_CACHE_SIZE = 10_000
+HERO_CACHE_TTL = 60.0
+
+hero_cache = LRUCache(maxsize=HERO_CACHE_SIZE, ttl=HERO_CACHE_TTL)
+
+
+@app.get("/cache/heroes")
+def read_hero_cache_stats():
+    return hero_cache.stats()
+
+
 @app.get("/heroes/{hero_id}", response_model=HeroPublic)
-def read_hero(hero_id: int, session: SessionDep):
-    hero = session.get(Hero, hero_id)
-    if not hero:
+def read_hero(hero_id: int, if_none_match: Annotated[str | None, Header()] = None):
+    cached = hero_cache.get(hero_id)
+    if cached is None:
+        generation = hero_cache.generation
+        with Session(read_engine) as session:
+            hero = session.get(Hero, hero_id)
+            if not hero:
+                raise HTTPException(status_code=404, detail="Hero not found")
+            etag = hero_etag(hero.id, hero.version)
+            if etag_in(etag, if_none_match):
+                return not_modified(etag)
+            content = HeroPublic.model_validate(hero).model_dump_json().encode()
+        cached = (etag, content)
+        hero_cache.put(hero_id, cached, generation)
+
+    etag, content = cached
+    if etag_in(etag, if_none_match):
+        return not_modified(etag)
+    return Response(content=content, media_type="application/json", headers={"ETag": etag})
+
+
+# @app.patch("/heroes/{hero_id}", response_model=HeroPublic)
+# def update_hero(hero_id: int, hero: HeroUpdate, session: SessionDep):
+#     hero_db = session.get(Hero, hero_id)
+#     if not hero_db:
+#         raise HTTPException(status_code=404, detail="Hero not found")
+#     hero_data = hero.model_dump(exclude_unset=True)
+#     hero_db.sqlmodel_update(hero_data)
+#     session.add(hero_db)
+#     session.commit()
+#     session.refresh(hero_db)
+#     return hero_db
+
+
+def update_hero_row(session: Session, hero_id: int, hero_data: dict, versions: list[int] | None):
+    if hero_data:
+        # one statement finds the hero, updates it and returns the new values (no row means 404)
+        statement = update(Hero).where(Hero.id == hero_id)
+        statement = statement.values(**hero_data, version=Hero.version + 1)
+        statement = statement.returning(*hero_columns)
+    else:
+        statement = select(*hero_columns).where(Hero.id == hero_id)
+    if versions is not None:
+        statement = statement.where(Hero.version.in_(versions))
+    row = session.connection().execute(statement).mappings().one_or_none()
+    if not row:
+        if versions is not None and session.get(Hero, hero_id):
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Hero not found")
-    return hero
+    return row
 
 
 @app.patch("/heroes/{hero_id}", response_model=HeroPublic)
-def update_hero(hero_id: int, hero: HeroUpdate, session: SessionDep):
-    hero_db = session.get(Hero, hero_id)
-    if not hero_db:
-        raise HTTPException(status_code=404, detail="Hero not found")
+def update_hero(
+    hero_id: int,
+    hero: HeroUpdate,
+    session: SessionDep,
+    response: Response,
+    if_match: Annotated[str | None, Header()] = None,
+):
     hero_data = hero.model_dump(exclude_unset=True)
-    hero_db.sqlmodel_update(hero_data)
-    session.add(hero_db)
-    session.commit()
-    session.refresh(hero_db)
-    return hero_db
+    versions = if_match_versions(hero_id, if_match)
+    row = commit_write(session, lambda session: update_hero_row(session, hero_id, hero_data, versions))
+    hero_cache.invalidate(hero_id)
+    response.headers["ETag"] = hero_etag(row["id"], row["version"])
+    return Hero.model_validate(row)
 
 
 @app.delete("/heroes/{hero_id}")
-def delete_hero(hero_id: int, session: SessionDep):
-    hero = session.get(Hero, hero_id)
-    if not hero:
+def delete_hero(
+    hero_id: int,
+    session: SessionDep,
+    if_match: Annotated[str | None, Header()] = None,
+):
+    versions = if_match_versions(hero_id, if_match)
+    statement = delete(Hero).where(Hero.id == hero_id)
+    if versions is not None:
+        statement = statement.where(Hero.version.in_(versions))
+    if session.connection().execute(statement).rowcount == 0:
+        if versions is not None and session.get(Hero, hero_id):
+            raise precondition_failed()
         raise HTTPException(status_code=404, detail="Hero not found")
-    session.delete(hero)
     session.commit()
+    hero_cache.invalidate(hero_id)
     return {"ok": True}
@@ -0,0 +1,141 @@
+from contextlib import asynccontextmanager
+from typing import Annotated
+
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Field, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from hero_cursor import HeroOrder, encode_cursor, select_heroes_after
+from hero_migrations import upgrade_hero_table
+
+
+class HeroBase(SQLModel):
+    name: str = Field(index=True)
+    age: int | None = Field(default=None, index=True)
+
+
+class Hero(HeroBase, table=True):
+    # the same table as 42_sql_relational_databases.py, whose etags need ids that are never
+    # given out again and a version that every write bumps
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id: int | None = Field(default=None, primary_key=True)
+    secret_name: str
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+
+class HeroPublic(HeroBase):
+    id: int
+
+
+class HeroCreate(HeroBase):
+    secret_name: str
+
+
+class HeroUpdate(HeroBase):
+    name: str | None = None
+    age: int | None = None
+    secret_name: str | None = None
+
+
+sqlite_file_name = "database.db"
+sqlite_url = f"sqlite+aiosqlite:///{sqlite_file_name}"
+
+engine = create_async_engine(sqlite_url)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        await conn.run_sync(upgrade_hero_table, Hero.__table__)
+
+
+async def get_session():
+    async with AsyncSession(engine) as session:
+        yield session
+
+
+SessionDep = Annotated[AsyncSession, Depends(get_session)]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_db_and_tables()
+    yield
+    await engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.post("/heroes/", response_model=HeroPublic)
+async def create_hero(hero: HeroCreate, session: SessionDep):
+    db_hero = Hero.model_validate(hero)
+    session.add(db_hero)
+    await session.commit()
+    await session.refresh(db_hero)
+    return db_hero
+
+
+@app.get("/heroes/", response_model=list[HeroPublic])
+async def read_heroes(
+    session: SessionDep,
+    response: Response,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=100)] = 100,
+    order_by: HeroOrder = "id",
+    after: str | None = None,
+):
+    heroes = []
+    for statement in select_heroes_after(Hero, order_by, after):
+        if after is None:
+            statement = statement.offset(offset)
+        heroes += (await session.exec(statement.limit(limit - len(heroes)))).all()
+        if len(heroes) == limit:
+            break
+    if heroes and len(heroes) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(order_by, heroes[-1])
+    return heroes
+
+
+@app.get("/heroes/{hero_id}", response_model=HeroPublic)
+async def read_hero(hero_id: int, session: SessionDep):
+    hero = await session.get(Hero, hero_id)
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    return hero
+
+
+@app.patch("/heroes/{hero_id}", response_model=HeroPublic)
+async def update_hero(hero_id: int, hero: HeroUpdate, session: SessionDep):
+    hero_db = await session.get(Hero, hero_id)
+    if not hero_db:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    hero_data = hero.model_dump(exclude_unset=True)
+    hero_db.sqlmodel_update(hero_data)
+    hero_db.version = Hero.version + 1
+    session.add(hero_db)
+    await session.commit()
+    await session.refresh(hero_db)
+    return hero_db
+
+
+@app.delete("/heroes/{hero_id}")
+async def delete_hero(hero_id: int, session: SessionDep):
+    hero = await session.get(Hero, hero_id)
+    if not hero:
+        raise HTTPException(status_code=404, detail="Hero not found")
+    await session.delete(hero)
+    await session.commit()
+    return {"ok": True}
@@ -1,7 +1,10 @@
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, HTTPException, Query
-from sqlmodel import Field, Session, SQLModel, create_engine, select
+from fastapi import Depends, FastAPI, HTTPException, Query, Response
+from sqlmodel import Field, Session, SQLModel, create_engine
+
+from hero_cursor import HeroOrder, encode_cursor, select_heroes_after
+from hero_migrations import upgrade_hero_table
 
 
 class HeroBase(SQLModel):
@@ -10,8 +13,13 @@ class HeroBase(SQLModel):
 
 
 class Hero(HeroBase, table=True):
+    # the same table as 42_sql_relational_databases.py, whose etags need ids that are never
+    # given out again and a version that every write bumps
+    __table_args__ = {"sqlite_autoincrement": True}
+
     id: int | None = Field(default=None, primary_key=True)
     secret_name: str
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
 
 
 class HeroPublic(HeroBase):
@@ -37,6 +45,8 @@ engine = create_engine(sqlite_url, connect_args=connect_args)
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        upgrade_hero_table(conn, Hero.__table__)
 
 
 def get_session():
@@ -65,10 +75,21 @@ def create_hero(hero: HeroCreate, session: SessionDep):
 @app.get("/heroes/", response_model=list[HeroPublic])
 def read_heroes(
     session: SessionDep,
+    response: Response,
     offset: int = 0,
     limit: Annotated[int, Query(le=100)] = 100,
+    order_by: HeroOrder = "id",
+    after: str | None = None,
 ):
-    heroes = session.exec(select(Hero).offset(offset).limit(limit)).all()
+    heroes = []
+    for statement in select_heroes_after(Hero, order_by, after):
+        if after is None:
+            statement = statement.offset(offset)
+        heroes += session.exec(statement.limit(limit - len(heroes))).all()
+        if len(heroes) == limit:
+            break
+    if heroes and len(heroes) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(order_by, heroes[-1])
     return heroes
 
 
@@ -87,6 +108,7 @@ def update_hero(hero_id: int, hero: HeroUpdate, session: SessionDep):
         raise HTTPException(status_code=404, detail="Hero not found")
     hero_data = hero.model_dump(exclude_unset=True)
     hero_db.sqlmodel_update(hero_data)
+    hero_db.version = Hero.version + 1
     session.add(hero_db)
     session.commit()
     session.refresh(hero_db)
@@ -0,0 +1,96 @@
+"""Shared helpers for the benchmark scripts.
+
+Run the benchmarks from the repository root, e.g. ``python -m benchmarks.sqlite_profile``.
+Every benchmark prints a table, or one JSON object per result with ``--json``.
+"""
+
+import argparse
+import importlib
+import json
+import time
+import types
+from datetime import timedelta
+from pathlib import Path
+
+from sqlmodel import create_engine
+
+
+def load_tutorial(name: str):
+    # the tutorial files start with a number, so they can't be imported with a plain import statement
+    return importlib.import_module(name)
+
+
+def load_notebook(name: str) -> types.SimpleNamespace:
+    # runs the code cells of <name>.ipynb, in order, and returns what they defined
+    with open(f"{name}.ipynb", encoding="utf-8") as f:
+        cells = json.load(f)["cells"]
+    namespace = {"__name__": name}
+    for cell in cells:
+        if cell["cell_type"] == "code":
+            exec("".join(cell["source"]), namespace)
+    return types.SimpleNamespace(**namespace)
+
+
+def use_users_db(auth, path: Path):
+    # points the 38_* tutorial (auth) at a fresh users.db, with the repository, the revocation
+    # list and the key ring built on it, and creates the tables
+    auth.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    auth.user_repository = auth.UserRepository(
+        auth.engine, maxsize=auth.USER_CACHE_SIZE, ttl=auth.USER_CACHE_TTL
+    )
+    auth.revocation_list = auth.RevocationList(
+        auth.engine, capacity=auth.REVOCATION_CAPACITY, error_rate=auth.REVOCATION_ERROR_RATE
+    )
+    auth.key_ring = auth.KeyRing(
+        auth.engine,
+        auth.ALGORITHM,
+        rotate_after=timedelta(minutes=auth.KEY_ROTATION_MINUTES),
+        keep_for=timedelta(days=auth.REFRESH_TOKEN_EXPIRE_DAYS),
+        reload_after=timedelta(seconds=auth.KEY_RELOAD_SECONDS),
+    )
+    auth.create_db_and_tables()
+
+
+def percentile(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float, **extra) -> dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "name": name,
+        "ops": count,
+        "ops_per_sec": round(count / elapsed, 1) if elapsed else 0.0,
+        "mean_ms": round(sum(latencies) / count * 1000, 3) if count else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        **extra,
+    }
+
+
+def timed(fn, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def make_parser(description: str) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per result")
+    return parser
+
+
+def report(results: list[dict], as_json: bool = False):
+    if as_json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    columns = list(dict.fromkeys(key for result in results for key in result))
+    rows = [[str(result.get(column, "")) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
@@ -0,0 +1,121 @@
+"""Load test of the threadpool hero service against the native async one.
+
+    python -m benchmarks.async_heroes --requests 2000 --concurrency 1 10 50 200
+
+Requests go through httpx's ASGITransport, so the app runs in-process and no network is involved.
+90% of the requests are GET /heroes/{hero_id}, the rest POST /heroes/ (see --write-ratio).
+42_sql_relational_databases.py and 42_sql_relational_databases_async.py declare the same
+hero table, so each implementation is measured in its own subprocess.
+"""
+
+import asyncio
+import inspect
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize
+
+IMPLEMENTATIONS = {
+    "threadpool": "42_sql_relational_databases",
+    "async": "42_sql_relational_databases_async",
+}
+
+
+async def load(app, rows, requests, concurrency, write_ratio) -> tuple[list[float], float, int]:
+    rng = random.Random(concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(client):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            if rng.random() < write_ratio:
+                hero = {"name": "New Hero", "age": 30, "secret_name": "New Secret"}
+                response = await client.post("/heroes/", json=hero)
+            else:
+                response = await client.get(f"/heroes/{rng.randint(1, rows)}")
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(client) for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+    return latencies, elapsed, errors
+
+
+def run_implementation(name, args) -> list[dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        # both services open "database.db" relative to the working directory
+        os.chdir(tmp)
+        heroes = load_tutorial(IMPLEMENTATIONS[name])
+        if hasattr(heroes, "hero_cache"):
+            # compare the database paths, the async service has no read cache
+            heroes.hero_cache.maxsize = 0
+        if inspect.iscoroutinefunction(heroes.create_db_and_tables):
+            asyncio.run(heroes.create_db_and_tables())
+        else:
+            heroes.create_db_and_tables()
+        with sqlite3.connect("database.db") as conn:
+            conn.executemany(
+                "INSERT INTO hero (name, age, secret_name) VALUES (?, ?, ?)",
+                ((f"Hero {i}", i % 90, f"Secret {i}") for i in range(args.rows)),
+            )
+
+        async def main():
+            results = []
+            for concurrency in args.concurrency:
+                latencies, elapsed, errors = await load(
+                    heroes.app, args.rows, args.requests, concurrency, args.write_ratio
+                )
+                results.append(
+                    summarize(name, latencies, elapsed, concurrency=concurrency, errors=errors)
+                )
+            disposed = heroes.engine.dispose()
+            if inspect.isawaitable(disposed):
+                await disposed
+            return results
+
+        return asyncio.run(main())
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 200])
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument(
+        "--implementation",
+        choices=IMPLEMENTATIONS,
+        help="run a single implementation and print its results as JSON (used internally)",
+    )
+    args = parser.parse_args()
+
+    if args.implementation:
+        report(run_implementation(args.implementation, args), as_json=True)
+        return
+
+    results = []
+    for name in IMPLEMENTATIONS:
+        command = [sys.executable, "-m", "benchmarks.async_heroes", "--implementation", name]
+        command += sys.argv[1:]
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+        results += [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+    results.sort(key=lambda result: (result["concurrency"], result["name"]))
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
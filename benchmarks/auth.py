@@ -0,0 +1,146 @@
+"""Auth flow of 38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens.py, in-process.
+
+    python -m benchmarks.auth --concurrency 1 2 4 8 --logins 16 --requests 2000 --json
+
+Requests go through httpx's ASGI transport straight into the app, no sockets. Measures:
+  login c=N              /token throughput with N logins in flight (bcrypt at the calibrated cost)
+  /users/me/ valid       a valid token, warm token cache (every request after the first)
+  /users/me/ valid cold  the token cache disabled, every request verifies the signature
+  /users/me/ garbage     rejection of a token that isn't a JWT
+  /users/me/ bad sig     rejection of a well-formed token signed with an unknown key
+and the split of one authenticated request, each part called directly:
+  verify_token           jwt.decode with the signature check
+  get_user               the user repository lookup (cached)
+  is_revoked             the jti revocation check
+  dependency chain       get_current_user + get_current_active_user, warm token cache
+The login limiter is off, all logins come from one client.
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import jwt
+from fastapi import HTTPException
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize, use_users_db
+
+auth = load_tutorial("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+login_form = {"username": "johndoe", "password": "secret"}
+
+
+async def bench_logins(client: httpx.AsyncClient, concurrency: int, logins: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def login():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/token", data=login_form)
+            assert response.status_code == 200, response.text
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    return summarize(f"login c={concurrency}", latencies, time.perf_counter() - started)
+
+
+async def bench_requests(
+    client: httpx.AsyncClient, name: str, token: str, expected: int, requests: int
+) -> dict:
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get("/users/me/", headers=headers)
+        assert response.status_code == expected, response.text
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, time.perf_counter() - started)
+
+
+async def bench_call(name: str, call, requests: int) -> dict:
+    # call is a coroutine function or a plain function, rejections count as done
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            result = call()
+            if asyncio.iscoroutine(result):
+                await result
+        except HTTPException:
+            pass
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return summarize(name, latencies, elapsed, mean_us=round(elapsed / requests * 1e6, 2))
+
+
+async def run(args) -> list[dict]:
+    results = []
+    transport = httpx.ASGITransport(app=auth.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        # the first login rehashes the seeded password with the calibrated cost
+        response = await client.post("/token", data=login_form)
+        token = response.json()["access_token"]
+
+        for concurrency in args.concurrency:
+            results.append(await bench_logins(client, concurrency, args.logins))
+
+        results.append(await bench_requests(client, "/users/me/ valid", token, 200, args.requests))
+        token_cache = auth.token_cache
+        auth.token_cache = auth.TokenCache(maxsize=0)
+        results.append(
+            await bench_requests(client, "/users/me/ valid cold", token, 200, args.requests)
+        )
+        auth.token_cache = token_cache
+        results.append(
+            await bench_requests(client, "/users/me/ garbage", "not-a-jwt", 401, args.requests)
+        )
+        other_key = auth.generate_private_key(auth.key_ring.algorithm)
+        forged = jwt.encode(
+            jwt.decode(token, options={"verify_signature": False}),
+            other_key,
+            algorithm=auth.key_ring.algorithm,
+            headers={"kid": auth.key_ring.kid},
+        )
+        results.append(await bench_requests(client, "/users/me/ bad sig", forged, 401, args.requests))
+
+    payload = await auth.verify_token(token, "access")
+    results += [
+        await bench_call("verify_token", lambda: auth.verify_token(token, "access"), args.requests),
+        await bench_call(
+            "get_user", lambda: auth.user_repository.get(payload["sub"]), args.requests
+        ),
+        await bench_call(
+            "is_revoked", lambda: auth.revocation_list.is_revoked(payload["jti"]), args.requests
+        ),
+    ]
+
+    async def chain():
+        return await auth.get_current_active_user(await auth.get_current_user(token))
+
+    results.append(await bench_call("dependency chain", chain, args.requests))
+    return results
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_users_db(auth, Path(tmp) / "users.db")
+        auth.LOGIN_RATE_LIMIT = False
+        auth.calibrate_bcrypt(auth.BCRYPT_TARGET_MS)
+        results = asyncio.run(run(args))
+        results.append({"name": "bcrypt", **auth.bcrypt_calibration})
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
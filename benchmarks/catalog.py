@@ -0,0 +1,138 @@
+"""The id -> title Catalog (catalog.py) vs a dict, on millions of isbn-/imdb- ids.
+
+    python -m benchmarks.catalog --entries 2000000 --lookups 200000
+
+A file of "<id>\\t<title>" lines is written to a temporary directory: 60% isbn- ids, 40% imdb-
+ids, and most imdb ids have the title of a book (the film of the book). Rows:
+  load                 Catalog.from_file() vs reading the file into a dict, with the memory
+                       held (the buffers of the catalog, the dict with its keys and values)
+  get                  lookups of ids that exist, and ids that don't (1 in 10)
+  sample               a random entry, random.choice(list(data.items())) for the dict
+  sample namespace     a random imdb entry, a filtered list of the dict items for the dict
+The dict sampling rows copy the dict every time, so they only run --dict-samples times.
+"""
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks._common import make_parser, report, summarize
+from catalog import Catalog
+
+
+def write_file(path: Path, entries: int, rng: random.Random):
+    books = int(entries * 0.6)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(books):
+            f.write(f"isbn-978{rng.randrange(10**10):010d}\tBook number {i} of the catalog\n")
+        for i in range(entries - books):
+            if rng.random() < 0.8:
+                title = f"Book number {rng.randrange(books)} of the catalog"
+            else:
+                title = f"Original film {i}"
+            f.write(f"imdb-tt{i:08d}\t{title}\n")
+
+
+def read_dict(path: Path) -> dict[str, str]:
+    data = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            key, _, title = line.rstrip("\n").partition("\t")
+            data[key] = title
+    return data
+
+
+def catalog_bytes(catalog: Catalog) -> int:
+    buffers = [catalog.keys, catalog.key_offsets, catalog.hashes, catalog.title_numbers]
+    buffers += [catalog.titles, catalog.title_offsets, catalog.slots]
+    return sum(sys.getsizeof(buffer) for buffer in buffers)
+
+
+def dict_bytes(data: dict[str, str]) -> int:
+    # strings that are the same object (the same title read twice is not) are counted once
+    seen = set()
+    total = sys.getsizeof(data)
+    for key, value in data.items():
+        for string in (key, value):
+            if id(string) not in seen:
+                seen.add(id(string))
+                total += sys.getsizeof(string)
+    return total
+
+
+def bench(name: str, fn, args_list, **extra) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, time.perf_counter() - started, **extra)
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--entries", type=int, default=2_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--dict-samples", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "catalog.tsv"
+        write_file(path, args.entries, rng)
+
+        started = time.perf_counter()
+        catalog = Catalog.from_file(str(path))
+        catalog_load = time.perf_counter() - started
+        started = time.perf_counter()
+        data = read_dict(path)
+        dict_load = time.perf_counter() - started
+
+    assert len(catalog) == len(data)
+    keys = list(data)
+    lookups = [
+        (rng.choice(keys) if rng.random() < 0.9 else f"isbn-{rng.randrange(10**13)}",)
+        for _ in range(args.lookups)
+    ]
+    for (key,) in lookups[:10000]:
+        assert catalog.get(key) == data.get(key)
+    del keys
+
+    results = [
+        {
+            "name": "load catalog",
+            "ops": len(catalog),
+            "ops_per_sec": round(len(catalog) / catalog_load, 1),
+            "mb": round(catalog_bytes(catalog) / 2**20, 1),
+            "bytes_per_entry": round(catalog_bytes(catalog) / len(catalog), 1),
+        },
+        {
+            "name": "load dict",
+            "ops": len(data),
+            "ops_per_sec": round(len(data) / dict_load, 1),
+            "mb": round(dict_bytes(data) / 2**20, 1),
+            "bytes_per_entry": round(dict_bytes(data) / len(data), 1),
+        },
+        bench("get catalog", catalog.get, lookups),
+        bench("get dict", data.get, lookups),
+        bench("sample catalog", catalog.sample, [()] * args.lookups),
+        bench("sample catalog imdb", catalog.sample, [("imdb",)] * args.lookups),
+        bench(
+            "sample dict",
+            lambda: random.choice(list(data.items())),
+            [()] * args.dict_samples,
+        ),
+        bench(
+            "sample dict imdb",
+            lambda: random.choice([item for item in data.items() if item[0].startswith("imdb-")]),
+            [()] * args.dict_samples,
+        ),
+    ]
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
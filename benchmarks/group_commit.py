@@ -0,0 +1,87 @@
+"""Concurrent hero writes, one commit per write vs group commit.
+
+    python -m benchmarks.group_commit --threads 32 --seconds 5
+
+Worker threads call create_hero of 42_sql_relational_databases.py the way FastAPI's threadpool
+does. Every mode runs with synchronous=FULL (every commit waits for the disk) and with the
+tuned profile's synchronous=NORMAL.
+"""
+
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from fastapi import Response
+from sqlmodel import Session, SQLModel
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize
+
+heroes = load_tutorial("42_sql_relational_databases")
+
+
+def run(name, synchronous, group_commit, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'heroes.db'}"
+        profile = heroes.SQLiteProfile(synchronous=synchronous)
+        heroes.engine, heroes.read_engine = heroes.create_engines(url, profile)
+        SQLModel.metadata.create_all(heroes.engine)
+        if group_commit:
+            heroes.group_committer = heroes.GroupCommitter(heroes.engine, args.window, args.max_batch)
+
+        latencies, errors = [], []
+        deadline = time.perf_counter() + args.seconds
+
+        def worker():
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                hero = heroes.HeroCreate(name="New Hero", age=30, secret_name="New Secret")
+                try:
+                    with Session(heroes.engine) as session:
+                        heroes.create_hero(hero, session, Response())
+                except Exception as e:
+                    errors.append(repr(e))
+                latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        batch_size = 1.0
+        if group_commit:
+            committer, heroes.group_committer = heroes.group_committer, None
+            committer.close()
+            batch_size = round(committer.writes / max(committer.batches, 1), 1)
+        heroes.engine.dispose()
+        heroes.read_engine.dispose()
+
+    return summarize(
+        f"{name} synchronous={synchronous}",
+        latencies,
+        elapsed,
+        avg_batch=batch_size,
+        errors=len(errors),
+    )
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--window", type=float, default=heroes.GROUP_COMMIT_WINDOW)
+    parser.add_argument("--max-batch", type=int, default=heroes.GROUP_COMMIT_MAX_BATCH)
+    args = parser.parse_args()
+
+    results = []
+    for synchronous in ("FULL", "NORMAL"):
+        results.append(run("commit per write", synchronous, False, args))
+        results.append(run("group commit", synchronous, True, args))
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Tag-filtered, ordered, paginated queries on the in-memory ItemStore (item_store.py).
+
+    python -m benchmarks.item_store --items 1000000 --queries 2000
+
+The items get 1 to 6 tags (3 on average) out of --tags tags, drawn from a Zipf distribution, so a
+few tags are on a large part of the items and most are rare, and a created_at spread over a year
+in random order. The queries ask for 1, 2 or 3 tags, also drawn from the Zipf distribution, ordered
+by created_at or updated_at, and one of the first 5 pages of 20. Rows:
+  load               bulk loading the items (indexes sorted once at the end)
+  query N tags       ItemStore.query(), with how often each plan was picked
+  scan / intersect   the same queries with the plan forced, the planner should beat both
+  linear             filter every item, then sort the matches, on --linear-queries of the queries
+  add, update        single writes into the indexes
+Every linear query is checked to give the same page as the store, with every plan.
+"""
+
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from benchmarks._common import make_parser, report, summarize
+from item_store import ItemStore
+
+
+def zipf_weights(count: int, s: float = 1.1) -> list[float]:
+    weights = []
+    total = 0.0
+    for rank in range(1, count + 1):
+        total += 1 / rank**s
+        weights.append(total)
+    return weights  # cumulative, for random.choices(cum_weights=...)
+
+
+def build_store(args, rng: random.Random) -> tuple[ItemStore, float]:
+    tags = [f"tag{i}" for i in range(args.tags)]
+    cum_weights = zipf_weights(args.tags)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def items():
+        for i in range(args.items):
+            count = rng.choices((1, 2, 3, 4, 5, 6), (15, 25, 25, 15, 12, 8))[0]
+            item_tags = rng.choices(tags, cum_weights=cum_weights, k=count)
+            created_at = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+            yield {"name": f"Item {i}"}, item_tags, created_at
+
+    store = ItemStore()
+    started = time.perf_counter()
+    store.load(items())
+    return store, time.perf_counter() - started
+
+
+def linear_query(store: ItemStore, tags, order_by, offset, limit):
+    wanted = set(tags)
+    matches = [item for item in store.items.values() if wanted.issubset(item.tags)]
+    matches.sort(key=lambda item: (getattr(item, order_by), item.id))
+    return matches[offset : offset + limit]
+
+
+def make_queries(args, rng: random.Random):
+    tags = [f"tag{i}" for i in range(args.tags)]
+    cum_weights = zipf_weights(args.tags)
+    queries = []
+    for _ in range(args.queries):
+        count = rng.choice((1, 2, 3))
+        query_tags = list(dict.fromkeys(rng.choices(tags, cum_weights=cum_weights, k=count)))
+        order_by = rng.choice(("created_at", "updated_at"))
+        queries.append((query_tags, order_by, 20 * rng.randrange(5), 20))
+    return queries
+
+
+def run_queries(store: ItemStore, name: str, queries, extra=None) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for tags, order_by, offset, limit in queries:
+        start = time.perf_counter()
+        store.query(tags, order_by, offset, limit)
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, time.perf_counter() - started, **(extra or {}))
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--tags", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--linear-queries", type=int, default=20)
+    parser.add_argument("--writes", type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    store, load_seconds = build_store(args, rng)
+    queries = make_queries(args, rng)
+    results = [
+        {
+            "name": f"load {args.items} items",
+            "ops": args.items,
+            "ops_per_sec": round(args.items / load_seconds, 1),
+            "tags": len(store.postings),
+            "largest_posting": max(len(posting) for posting in store.postings.values()),
+        }
+    ]
+
+    for count in (1, 2, 3):
+        subset = [query for query in queries if len(query[0]) == count]
+        plans = Counter(store.plan(tags, offset, limit) for tags, _, offset, limit in subset)
+        results.append(run_queries(store, f"query {count} tags", subset, dict(sorted(plans.items()))))
+
+    planner = store._plan
+    for plan in ("scan", "intersect"):
+        store._plan = lambda postings, wanted: "empty" if not postings[0] else plan
+        results.append(run_queries(store, plan, queries))
+    store._plan = planner
+    results.append(run_queries(store, "planned", queries))
+
+    checked = queries[: args.linear_queries]
+    latencies = []
+    started = time.perf_counter()
+    for query in checked:
+        start = time.perf_counter()
+        expected = [item.id for item in linear_query(store, *query)]
+        latencies.append(time.perf_counter() - start)
+        for plan in (None, "scan", "intersect"):
+            if plan:
+                store._plan = lambda postings, wanted: "empty" if not postings[0] else plan
+            assert [item.id for item in store.query(*query)] == expected, (query, plan)
+            store._plan = planner
+    results.append(summarize("linear", latencies, time.perf_counter() - started))
+
+    for operation in ("add", "update"):
+        latencies = []
+        started = time.perf_counter()
+        for i in range(args.writes):
+            start = time.perf_counter()
+            if operation == "add":
+                store.add({"name": f"New item {i}"}, ["tag0", f"tag{i % args.tags}"])
+            else:
+                store.update(rng.randrange(1, args.items + 1), tags=["tag1", "tag2"])
+            latencies.append(time.perf_counter() - start)
+        results.append(summarize(operation, latencies, time.perf_counter() - started))
+
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""JSON response encoding, FastAPI's default JSONResponse vs FastJSONResponse (fast_json.py).
+
+    python -m benchmarks.json_response --items 1000 --images 5 --requests 200
+
+The payload is a page of the nested Item/Image models of 10_body_nested_models.py (HttpUrl,
+set of tags, list of images), returned from a route in an app driven in-process:
+  JSONResponse             the default, jsonable_encoder then json.dumps
+  FastJSONResponse         as the default response class, jsonable_encoder then pydantic-core
+  FastJSONResponse direct  the route returns FastJSONResponse(content), pydantic-core only
+The "render" rows time the encoding alone, without the app.
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize
+from fast_json import FastJSONResponse
+
+nested = load_tutorial("10_body_nested_models")
+
+
+def build_payload(items: int, images: int) -> dict:
+    return {
+        "items": [
+            nested.Item(
+                name=f"Item {i}",
+                description="The pretender " * 4,
+                price=42.0 + i,
+                tax=3.2,
+                tags={"rock", "metal", "bar", f"tag{i % 50}"},
+                image=[
+                    nested.Image(url=f"http://example.com/{i}/{j}.jpg", name=f"Image {j}")
+                    for j in range(images)
+                ],
+            )
+            for i in range(items)
+        ]
+    }
+
+
+def build_app(payload: dict) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default")
+    async def default():
+        return payload
+
+    @app.get("/fast", response_class=FastJSONResponse)
+    async def fast():
+        return payload
+
+    @app.get("/direct")
+    async def direct():
+        return FastJSONResponse(payload)
+
+    return app
+
+
+async def bench_route(client: httpx.AsyncClient, name: str, path: str, requests: int) -> dict:
+    latencies = []
+    size = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = await client.get(path)
+        assert response.status_code == 200, response.text
+        size = len(response.content)
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, time.perf_counter() - started, bytes=size)
+
+
+def bench_render(name: str, render, requests: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        render()
+        latencies.append(time.perf_counter() - start)
+    return summarize(name, latencies, time.perf_counter() - started)
+
+
+async def run(payload: dict, args) -> list[dict]:
+    transport = httpx.ASGITransport(app=build_app(payload))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        routes = [
+            ("JSONResponse", "/default"),
+            ("FastJSONResponse", "/fast"),
+            ("FastJSONResponse direct", "/direct"),
+        ]
+        return [await bench_route(client, name, path, args.requests) for name, path in routes]
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    payload = build_payload(args.items, args.images)
+    encoded = jsonable_encoder(payload)
+    # the responses must be the same json, tags are a set so compare them sorted
+    for item in encoded["items"]:
+        item["tags"].sort()
+    fast = json.loads(FastJSONResponse(payload).body)
+    for item in fast["items"]:
+        item["tags"].sort()
+    assert fast == encoded
+
+    results = asyncio.run(run(payload, args))
+    default_response = JSONResponse(None)
+    fast_response = FastJSONResponse(None)
+    results += [
+        bench_render(
+            "render json.dumps(jsonable_encoder)",
+            lambda: default_response.render(jsonable_encoder(payload)),
+            args.requests,
+        ),
+        bench_render(
+            "render pydantic-core",
+            lambda: fast_response.render(payload),
+            args.requests,
+        ),
+    ]
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""The append-only LogStore (log_store.py) with millions of items.
+
+    python -m benchmarks.log_store --items 1000000 --reads 100000
+
+The items are the Item of 26_json_compatible_encoder.ipynb (title, a timestamp, a description),
+written with model_dump() so the datetime is encoded as a number. Rows:
+  put                 writing every item, durable=False (the flusher fsyncs in the background)
+  get                 reads of random keys, most are in sealed segments (mmap), some in the active
+                      one (pread), --segment-size bytes a segment
+  reopen              opening the store, replaying every segment to rebuild the index
+  compact             compaction after half of the items were overwritten
+  put durable batch   put() that waits for its fsync, with --writers threads sharing the fsyncs
+  put durable always  sync="always", one fsync per put
+Also reports the bytes per record, and what jsonable_encoder(item) as json would take.
+"""
+
+import json
+import random
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from benchmarks._common import make_parser, report, summarize
+from log_store import HEADER, LogStore, encode_value
+
+
+class Item(BaseModel):
+    title: str
+    timestamp: datetime
+    description: str | None = None
+
+
+def make_item(i: int) -> dict:
+    item = Item(
+        title=f"Item {i}",
+        timestamp=datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(seconds=i),
+        description=None if i % 3 else f"The description of item {i}",
+    )
+    return item.model_dump()
+
+
+def bench_durable(path: Path, sync: str, writers: int, writes: int) -> dict:
+    latencies = []
+    with LogStore(path, sync=sync, compact_interval=None) as store:
+
+        def write(n: int):
+            for j in range(writes):
+                start = time.perf_counter()
+                store.put(f"durable-{n}-{j}", make_item(j))
+                latencies.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        syncs = store.stats()["syncs"]
+    return summarize(f"put durable {sync}", latencies, elapsed, writers=writers, syncs=syncs)
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--items", type=int, default=1_000_000)
+    parser.add_argument("--reads", type=int, default=100_000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--durable-writes", type=int, default=200)
+    parser.add_argument("--segment-size", type=int, default=16 * 1024 * 1024)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    results = []
+    tmp = Path(tempfile.mkdtemp())
+    try:
+        path = tmp / "items"
+        store = LogStore(path, segment_size=args.segment_size, compact_interval=None)
+        latencies = []
+        started = time.perf_counter()
+        for i in range(args.items):
+            value = make_item(i)
+            start = time.perf_counter()
+            store.put(f"item-{i}", value, durable=False)
+            latencies.append(time.perf_counter() - start)
+        results.append(summarize("put", latencies, time.perf_counter() - started))
+
+        stats = store.stats()
+        sample = make_item(1)
+        results[-1].update(
+            bytes=stats["bytes"],
+            segments=stats["segments"],
+            record_bytes=HEADER.size + len("item-1") + len(encode_value(sample)),
+            json_record_bytes=HEADER.size
+            + len("item-1")
+            + len(json.dumps(jsonable_encoder(Item(**sample)), separators=(",", ":"))),
+        )
+
+        keys = [f"item-{rng.randrange(args.items)}" for _ in range(args.reads)]
+        latencies = []
+        started = time.perf_counter()
+        for key in keys:
+            start = time.perf_counter()
+            value = store.get(key)
+            latencies.append(time.perf_counter() - start)
+            assert value is not None
+        results.append(summarize("get", latencies, time.perf_counter() - started))
+        assert store.get("item-7") == make_item(7)
+        store.close()
+
+        started = time.perf_counter()
+        store = LogStore(path, segment_size=args.segment_size, compact_interval=None)
+        reopen = time.perf_counter() - started
+        assert len(store) == args.items
+        results.append(
+            {"name": "reopen", "ops": args.items, "ops_per_sec": round(args.items / reopen, 1)}
+        )
+
+        for i in range(0, args.items, 2):
+            store.put(f"item-{i}", make_item(-i), durable=False)
+        before = store.stats()
+        started = time.perf_counter()
+        store.compact()
+        compact = time.perf_counter() - started
+        after = store.stats()
+        assert store.get("item-2") == make_item(-2) and store.get("item-3") == make_item(3)
+        results.append(
+            {
+                "name": "compact",
+                "ops": before["keys"],
+                "ops_per_sec": round(before["keys"] / compact, 1),
+                "bytes_before": before["bytes"],
+                "bytes": after["bytes"],
+            }
+        )
+        store.close()
+
+        results.append(bench_durable(tmp / "batch", "batch", args.writers, args.durable_writes))
+        results.append(bench_durable(tmp / "always", "always", args.writers, args.durable_writes))
+    finally:
+        shutil.rmtree(tmp)
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""/users/me/ latency while a burst of logins is running, bcrypt inline vs on the hash executor.
+
+    python -m benchmarks.login_storm --logins 32 --interval 10
+
+Everything runs in-process on one event loop through httpx's ASGI transport. "inline" calls
+verify_password on the event loop like the endpoint used to, "executor" is the current code.
+"""
+
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize, use_users_db
+
+auth = load_tutorial("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+
+
+login_form = {"username": "johndoe", "password": "secret"}
+
+
+async def verify_password_inline(plain_password, hashed_password):
+    return auth.verify_and_update_password(plain_password, hashed_password)
+
+
+async def run(name: str, args) -> list[dict]:
+    transport = httpx.ASGITransport(app=auth.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.post("/token", data=login_form)
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        login_latencies = []
+
+        async def login():
+            start = time.perf_counter()
+            response = await client.post("/token", data=login_form)
+            assert response.status_code == 200, response.text
+            login_latencies.append(time.perf_counter() - start)
+
+        probe_latencies = []
+
+        async def probe():
+            # one probe every --interval ms on a fixed schedule until the logins are done.
+            # the latency is counted from when the probe was due, so time the event loop spent
+            # blocked before it could even send the request is included
+            due = time.perf_counter()
+            while not storm.done():
+                await asyncio.sleep(max(0.0, due - time.perf_counter()))
+                response = await client.get("/users/me/", headers=headers)
+                assert response.status_code == 200, response.text
+                probe_latencies.append(time.perf_counter() - due)
+                due += args.interval / 1000
+
+        started = time.perf_counter()
+        storm = asyncio.gather(*(login() for _ in range(args.logins)))
+        await probe()
+        await storm
+        elapsed = time.perf_counter() - started
+    return [
+        summarize(f"{name} /token", login_latencies, elapsed),
+        summarize(f"{name} /users/me/", probe_latencies, elapsed),
+    ]
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--interval", type=float, default=10.0, help="ms between probes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_users_db(auth, Path(tmp) / "users.db")
+        # the whole storm comes from one client for one user, the login limiter would stop it
+        auth.LOGIN_RATE_LIMIT = False
+        verify_password_async = auth.verify_and_update_password_async
+        auth.verify_and_update_password_async = verify_password_inline
+        results = asyncio.run(run("inline", args))
+        auth.verify_and_update_password_async = verify_password_async
+        results += asyncio.run(run("executor", args))
+        results.append({"name": "hash executor", **auth.hash_executor.stats()})
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
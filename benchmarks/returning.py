@@ -0,0 +1,98 @@
+"""Write latency and statements per request, refresh after commit vs INSERT/UPDATE ... RETURNING.
+
+    python -m benchmarks.returning --writes 2000
+
+The "refresh" functions are the create_hero/update_hero bodies from before RETURNING was used,
+the "returning" ones are the current path operation functions of 42_sql_relational_databases.py.
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi import Response
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize
+
+heroes = load_tutorial("42_sql_relational_databases")
+
+
+def create_hero_refresh(hero, session):
+    db_hero = heroes.Hero.model_validate(hero)
+    session.add(db_hero)
+    session.commit()
+    session.refresh(db_hero)
+    return db_hero
+
+
+def update_hero_refresh(hero_id, hero, session):
+    hero_db = session.get(heroes.Hero, hero_id)
+    hero_db.sqlmodel_update(hero.model_dump(exclude_unset=True))
+    session.add(hero_db)
+    session.commit()
+    session.refresh(hero_db)
+    return hero_db
+
+
+def run(name, create, update, args) -> list[dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'heroes.db'}"
+        engine, _ = heroes.create_engines(url, heroes.SQLiteProfile())
+        SQLModel.metadata.create_all(engine)
+
+        statements = 0
+
+        def count(*args):
+            nonlocal statements
+            statements += 1
+
+        event.listen(engine, "before_cursor_execute", count)
+
+        results = []
+        for operation in ("create", "update"):
+            latencies = []
+            statements = 0
+            started = time.perf_counter()
+            for i in range(args.writes):
+                start = time.perf_counter()
+                with Session(engine) as session:
+                    if operation == "create":
+                        hero = heroes.HeroCreate(name=f"Hero {i}", age=i % 90, secret_name="Secret")
+                        # returning the model is part of the request, FastAPI reads every field
+                        create(hero, session).model_dump()
+                    else:
+                        hero = heroes.HeroUpdate(age=(i + 1) % 90)
+                        update(i + 1, hero, session).model_dump()
+                latencies.append(time.perf_counter() - start)
+            elapsed = time.perf_counter() - started
+            results.append(
+                summarize(
+                    f"{name} {operation}",
+                    latencies,
+                    elapsed,
+                    statements_per_request=round(statements / args.writes, 2),
+                )
+            )
+        engine.dispose()
+    return results
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = run("refresh", create_hero_refresh, update_hero_refresh, args)
+    results += run(
+        "returning",
+        lambda hero, session: heroes.create_hero(hero, session, Response()),
+        lambda hero_id, hero, session: heroes.update_hero(hero_id, hero, session, Response()),
+        args,
+    )
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Cost of the jti revocation check per authenticated request.
+
+    python -m benchmarks.revocation --revoked 100000 --checks 100000
+
+Revokes --revoked random jtis, then checks --checks jtis that are not revoked (the common case):
+  "table"  looks every jti up in the revoked_tokens table
+  "bloom"  is RevocationList.is_revoked, the table is only read when the filter says maybe
+  "none"   no revocation check at all, the baseline
+The last rows are the cached get_current_user path with and without the check.
+"""
+
+import asyncio
+import secrets
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from sqlmodel import Session
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize, use_users_db
+
+auth = load_tutorial("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+
+
+def table_lookup(jti: str) -> bool:
+    with Session(auth.engine) as session:
+        return session.get(auth.RevokedToken, jti) is not None
+
+
+def run_checks(name: str, check, jtis: list[str]) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for jti in jtis:
+        start = time.perf_counter()
+        assert not check(jti)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return summarize(name, latencies, elapsed, mean_us=round(elapsed / len(jtis) * 1e6, 3))
+
+
+async def run_requests(name: str, token: str, requests: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        await auth.get_current_user(token)
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return summarize(name, latencies, elapsed, mean_us=round(elapsed / requests * 1e6, 3))
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--revoked", type=int, default=100_000)
+    parser.add_argument("--checks", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_users_db(auth, Path(tmp) / "users.db")
+        expires_at = time.time() + 3600
+        with Session(auth.engine) as session:
+            session.add_all(
+                auth.RevokedToken(jti=secrets.token_urlsafe(16), expires_at=expires_at)
+                for _ in range(args.revoked)
+            )
+            session.commit()
+        auth.revocation_list.load()
+
+        jtis = [secrets.token_urlsafe(16) for _ in range(args.checks)]
+        results = [
+            run_checks("table", table_lookup, jtis[: args.checks // 10]),
+            run_checks("bloom", auth.revocation_list.is_revoked, jtis),
+            run_checks("none", lambda jti: False, jtis),
+        ]
+        results[1]["table_lookups"] = auth.revocation_list.maybe
+        results[1]["filter_bytes"] = auth.revocation_list.stats()["filter_bytes"]
+
+        token = auth.create_access_token({"sub": "johndoe"}, timedelta(minutes=5))
+        results.append(asyncio.run(run_requests("get_current_user", token, args.checks)))
+        async def not_revoked(jti):
+            return False
+
+        is_revoked_async = auth.revocation_list.is_revoked_async
+        auth.revocation_list.is_revoked_async = not_revoked
+        results.append(
+            asyncio.run(run_requests("get_current_user without check", token, args.checks))
+        )
+        auth.revocation_list.is_revoked_async = is_revoked_async
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
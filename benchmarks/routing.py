@@ -0,0 +1,120 @@
+"""Route dispatch cost as the number of routes grows, starlette's linear scan vs RouteIndex.
+
+    python -m benchmarks.routing --routes 10 100 1000 5000 --lookups 20000
+
+The routes look like a big API made of many routers: per resource a list, create, read, update,
+delete, a search and a nested read, GET /res12/{id:int}/children/{child_id} and so on.
+Lookups pick a random route and a concrete path for it, one in ten is a path that matches
+nothing (a 404 has to try everything in the linear scan).
+  linear  the loop of starlette's Router.app, route.matches() on every route until a full match
+  index   RouteIndex.match(), the prefix tree narrows it down to a few candidates first
+Also reports how long building the index and finding the route conflicts take.
+"""
+
+import random
+import time
+
+from fastapi import APIRouter
+from starlette.routing import Match
+
+from benchmarks._common import make_parser, report, summarize
+from route_analysis import RouteIndex, find_route_conflicts
+
+
+async def endpoint():
+    return {}
+
+
+def build_routes(count: int):
+    router = APIRouter()
+    templates = [
+        ("GET", "/res{k}/", "/res{k}/"),
+        ("POST", "/res{k}/", "/res{k}/"),
+        ("GET", "/res{k}/search", "/res{k}/search"),
+        ("GET", "/res{k}/{{id:int}}", "/res{k}/42"),
+        ("PUT", "/res{k}/{{id:int}}", "/res{k}/42"),
+        ("DELETE", "/res{k}/{{id:int}}", "/res{k}/42"),
+        ("GET", "/res{k}/{{id:int}}/children/{{child_id}}", "/res{k}/42/children/abc"),
+    ]
+    requests = []
+    k = 0
+    while len(router.routes) < count:
+        for method, template, example in templates:
+            if len(router.routes) == count:
+                break
+            router.add_api_route(
+                template.format(k=k), endpoint, methods=[method], name=f"r{len(router.routes)}"
+            )
+            requests.append((method, example.format(k=k)))
+        k += 1
+    return router.routes, requests
+
+
+def linear_match(routes, scope):
+    partial = None
+    for route in routes:
+        match, child_scope = route.matches(scope)
+        if match == Match.FULL:
+            return match, route, child_scope
+        if match == Match.PARTIAL and partial is None:
+            partial = (match, route, child_scope)
+    return partial or (Match.NONE, None, {})
+
+
+def run(count: int, args) -> list[dict]:
+    routes, requests = build_routes(count)
+    rng = random.Random(count)
+    scopes = []
+    for _ in range(args.lookups):
+        if rng.random() < 0.1:
+            method, path = "GET", f"/missing/{rng.randrange(1000)}"
+        else:
+            method, path = rng.choice(requests)
+        scopes.append({"type": "http", "method": method, "path": path, "root_path": ""})
+
+    started = time.perf_counter()
+    index = RouteIndex(routes)
+    build_ms = round((time.perf_counter() - started) * 1000, 2)
+    started = time.perf_counter()
+    conflicts = find_route_conflicts(routes)
+    analyze_ms = round((time.perf_counter() - started) * 1000, 2)
+
+    matchers = {"linear": lambda scope: linear_match(routes, scope), "index": index.match}
+    results = []
+    for name, match in matchers.items():
+        latencies = []
+        matched = 0
+        started = time.perf_counter()
+        for scope in scopes:
+            start = time.perf_counter()
+            if match(scope)[0] == Match.FULL:
+                matched += 1
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+        results.append(
+            summarize(
+                f"{name} {count} routes",
+                latencies,
+                elapsed,
+                mean_us=round(elapsed / len(scopes) * 1e6, 2),
+                matched=matched,
+            )
+        )
+    results[-1].update(build_ms=build_ms, analyze_ms=analyze_ms, conflicts=len(conflicts))
+    return results
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--routes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--lookups", type=int, default=20000)
+    args = parser.parse_args()
+
+    results = []
+    for count in args.routes:
+        results += run(count, args)
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Serializing a page of ORM heroes as list[HeroPublic], per row, for pages of 100.
+
+    python -m benchmarks.row_serializer --page 100 --pages 2000
+
+The page is loaded once from a temporary database, the rows are real (instrumented) Hero objects.
+  response_model       what FastAPI does with response_model=list[HeroPublic]: validate every row
+                       into a HeroPublic (from_attributes), dump to python, render the json
+  validate+dump_json   TypeAdapter(list[HeroPublic]), validate_python(from_attributes) then
+                       dump_json, still one HeroPublic per row
+  RowSerializer        hero_rows.dump_json(), what read_heroes does now, no model instances
+The bytes of the last two are checked to be the same as the response_model ones.
+"""
+
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+from sqlmodel import Session, SQLModel, select
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize
+from fast_json import FastJSONResponse
+
+heroes = load_tutorial("42_sql_relational_databases")
+
+
+def load_page(size: int) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'heroes.db'}"
+        engine, _ = heroes.create_engines(url, heroes.SQLiteProfile())
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            for i in range(size):
+                session.add(heroes.Hero(name=f"Hero {i}", age=i % 90 or None, secret_name="Secret"))
+            session.commit()
+        with Session(engine, expire_on_commit=False) as session:
+            page = session.exec(select(heroes.Hero).order_by(heroes.Hero.id)).all()
+            # keep the rows loaded after the session is gone
+            session.expunge_all()
+        engine.dispose()
+    return page
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--pages", type=int, default=2000)
+    args = parser.parse_args()
+
+    page = load_page(args.page)
+    field = create_model_field(name="response", type_=list[heroes.HeroPublic], mode="serialization")
+    response = FastJSONResponse(None)
+    adapter = TypeAdapter(list[heroes.HeroPublic])
+    # read_heroes is a def, FastAPI serializes its result in the threadpool
+    loop = asyncio.new_event_loop()
+
+    def response_model():
+        content = loop.run_until_complete(
+            serialize_response(field=field, response_content=page, is_coroutine=False)
+        )
+        return response.render(content)
+
+    def validate_dump():
+        return adapter.dump_json(adapter.validate_python(page, from_attributes=True))
+
+    def row_serializer():
+        return heroes.hero_rows.dump_json(page)
+
+    expected = json.loads(response_model())
+    assert json.loads(validate_dump()) == expected
+    assert json.loads(row_serializer()) == expected
+
+    results = []
+    for name, serialize in [
+        ("response_model", response_model),
+        ("validate+dump_json", validate_dump),
+        ("RowSerializer", row_serializer),
+    ]:
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.pages):
+            start = time.perf_counter()
+            serialize()
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+        results.append(
+            summarize(
+                f"{name} {args.page} rows",
+                latencies,
+                elapsed,
+                us_per_row=round(elapsed / (args.pages * args.page) * 1e6, 2),
+            )
+        )
+    loop.close()
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""The batch schedule endpoint of 12_extra_data_types.ipynb vs one request per item.
+
+    python -m benchmarks.schedule_batch --items 10000 --batches 20
+
+The items have a start_datetime spread over a year (1 in 4 with a +02:00 offset), an end_datetime
+up to a day later and a process_after of up to an hour. The app of the notebook is driven
+in-process. Rows:
+  single           PUT /items/{item_id} once per item, on --single-items of the items
+  batch            POST /items/batch with all the items in columns, --batches times
+  compute python   start_process and duration in a python loop over datetime/timedelta objects
+  compute numpy    the same with datetime64/timedelta64 arrays, the inside of the batch endpoint
+us_per_item is what one item costs, the single row is that many microseconds per request.
+Every item of the batch is checked to give the same start_process and duration as the single
+item endpoint.
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+
+from benchmarks._common import load_notebook, make_parser, report, summarize
+
+extra = load_notebook("12_extra_data_types")
+
+
+def make_items(count: int, rng: random.Random) -> list[dict]:
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    plus_two = timezone(timedelta(hours=2))
+    items = []
+    for _ in range(count):
+        start_datetime = start + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        if rng.random() < 0.25:
+            start_datetime = start_datetime.astimezone(plus_two)
+        items.append(
+            {
+                "item_id": str(extra.UUID(int=rng.getrandbits(128), version=4)),
+                "start_datetime": start_datetime.isoformat(),
+                "end_datetime": (start_datetime + timedelta(seconds=rng.randrange(86400))).isoformat(),
+                "process_after": rng.randrange(3600 * 1000) / 1000,
+            }
+        )
+    return items
+
+
+def columns(items: list[dict]) -> dict:
+    return {key: [item[key] for item in items] for key in items[0]}
+
+
+def compute_python(items: list[dict]):
+    results = []
+    for item in items:
+        start_process = datetime.fromisoformat(item["start_datetime"]) + timedelta(
+            seconds=item["process_after"]
+        )
+        duration = datetime.fromisoformat(item["end_datetime"]) - start_process
+        results.append((start_process, duration.total_seconds()))
+    return results
+
+
+def compute_numpy(batch: dict):
+    start_datetime = extra.parse_datetimes(batch["start_datetime"])
+    end_datetime = extra.parse_datetimes(batch["end_datetime"])
+    start_process, duration = extra.schedule(start_datetime, end_datetime, batch["process_after"])
+    return start_process, duration / np.timedelta64(1, "s")
+
+
+def instant(value: str) -> datetime:
+    # the batch endpoint answers in UTC with a Z, the single one with the offset it was given
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+
+def bench(name: str, fn, runs: int, items_per_run: int) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    return summarize(
+        name,
+        latencies,
+        elapsed,
+        items=items_per_run,
+        us_per_item=round(elapsed / (runs * items_per_run) * 1e6, 2),
+    )
+
+
+async def run(items: list[dict], args) -> list[dict]:
+    transport = httpx.ASGITransport(app=extra.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        batch = columns(items)
+        response = await client.post("/items/batch", json=batch)
+        assert response.status_code == 200, response.text
+        answer = response.json()
+        assert answer["item_id"] == batch["item_id"]
+
+        single = items[: args.single_items]
+        latencies = []
+        started = time.perf_counter()
+        for i, item in enumerate(single):
+            body = {key: value for key, value in item.items() if key != "item_id"}
+            start = time.perf_counter()
+            response = await client.put(f"/items/{item['item_id']}", json=body)
+            latencies.append(time.perf_counter() - start)
+            one = response.json()
+            assert instant(one["start_process"]) == instant(answer["start_process"][i]), i
+            assert abs(one["duration"] - answer["duration"][i]) < 1e-6, i
+        elapsed = time.perf_counter() - started
+        results = [
+            summarize(
+                "single",
+                latencies,
+                elapsed,
+                items=1,
+                us_per_item=round(elapsed / len(single) * 1e6, 2),
+            )
+        ]
+
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(args.batches):
+            start = time.perf_counter()
+            response = await client.post("/items/batch", json=batch)
+            latencies.append(time.perf_counter() - start)
+        elapsed = time.perf_counter() - started
+        results.append(
+            summarize(
+                "batch",
+                latencies,
+                elapsed,
+                items=len(items),
+                us_per_item=round(elapsed / (args.batches * len(items)) * 1e6, 2),
+            )
+        )
+    return results
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--batches", type=int, default=20)
+    parser.add_argument("--single-items", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    items = make_items(args.items, rng)
+    results = asyncio.run(run(items, args))
+
+    batch = columns(items)
+    start_process, duration = compute_numpy(batch)
+    for i, (python_start, python_duration) in enumerate(compute_python(items)):
+        assert python_start.astimezone(timezone.utc).replace(tzinfo=None) == start_process[i].item()
+        assert abs(python_duration - duration[i]) < 1e-6
+    results.append(bench("compute python", lambda: compute_python(items), args.batches, len(items)))
+    results.append(bench("compute numpy", lambda: compute_numpy(batch), args.batches, len(items)))
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
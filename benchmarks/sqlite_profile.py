@@ -0,0 +1,88 @@
+"""Mixed read/write throughput of the hero service, default sqlite vs the tuned SQLiteProfile.
+
+    python -m benchmarks.sqlite_profile --threads 16 --seconds 5 --write-ratio 0.1
+
+Worker threads call the path operation functions of 42_sql_relational_databases.py directly,
+the same way FastAPI runs sync endpoints on its threadpool, against a fresh database file.
+"""
+
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from fastapi import Response
+from sqlmodel import Session, SQLModel
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize
+
+heroes = load_tutorial("42_sql_relational_databases")
+# every read should reach the database
+heroes.hero_cache.maxsize = 0
+
+
+def run(profile_name, profile, args) -> list[dict]:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'heroes.db'}"
+        heroes.engine, heroes.read_engine = heroes.create_engines(url, profile)
+        SQLModel.metadata.create_all(heroes.engine)
+        heroes.insert_hero_rows(
+            [
+                (i, {"name": f"Hero {i}", "age": i % 90, "secret_name": f"Secret {i}"})
+                for i in range(args.rows)
+            ]
+        )
+
+        reads, writes, errors = [], [], []
+        deadline = time.perf_counter() + args.seconds
+
+        def worker(seed):
+            rng = random.Random(seed)
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    if rng.random() < args.write_ratio:
+                        hero = heroes.HeroCreate(name="New Hero", age=30, secret_name="New Secret")
+                        with Session(heroes.engine) as session:
+                            heroes.create_hero(hero, session, Response())
+                        writes.append(time.perf_counter() - start)
+                    else:
+                        heroes.read_hero(rng.randint(1, args.rows))
+                        reads.append(time.perf_counter() - start)
+                except Exception as e:
+                    errors.append(repr(e))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        heroes.engine.dispose()
+        heroes.read_engine.dispose()
+
+    return [
+        summarize(f"{profile_name} read", reads, elapsed, errors=len(errors)),
+        summarize(f"{profile_name} write", writes, elapsed, errors=len(errors)),
+        summarize(f"{profile_name} total", reads + writes, elapsed, errors=len(errors)),
+    ]
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = run("default", None, args)
+    results += run("tuned", heroes.SQLiteProfile(reader_pool_size=args.threads), args)
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Per-request auth overhead of get_current_user, with and without the verified token cache.
+
+    python -m benchmarks.token_cache --requests 20000 --tokens 100
+
+Requests cycle through a fixed set of valid bearer tokens, like a group of logged in clients
+calling the API over and over. "uncached" sets the cache size to 0, so every request
+runs jwt.decode and builds the TokenData again.
+"""
+
+import asyncio
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from benchmarks._common import load_tutorial, make_parser, report, summarize, use_users_db
+
+auth = load_tutorial("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+
+
+async def run(name: str, tokens: list[str], cache_size: int, args) -> dict:
+    auth.token_cache = auth.TokenCache(maxsize=cache_size)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(args.requests):
+        start = time.perf_counter()
+        await auth.get_current_user(tokens[i % len(tokens)])
+        latencies.append(time.perf_counter() - start)
+    elapsed = time.perf_counter() - started
+    lookups = auth.token_cache.hits + auth.token_cache.misses
+    return summarize(
+        name,
+        latencies,
+        elapsed,
+        mean_us=round(sum(latencies) / len(latencies) * 1e6, 2),
+        hit_rate=round(auth.token_cache.hits / lookups, 4) if lookups else 0.0,
+    )
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_users_db(auth, Path(tmp) / "users.db")
+        # distinct tokens for the same user, the exp differs by a second per token
+        tokens = [
+            auth.create_access_token({"sub": "johndoe"}, timedelta(minutes=30, seconds=i))
+            for i in range(args.tokens)
+        ]
+        results = [
+            asyncio.run(run("uncached", tokens, 0, args)),
+            asyncio.run(run("cached", tokens, auth.TOKEN_CACHE_SIZE, args)),
+        ]
+    report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import random
+from array import array
+from itertools import accumulate
+from typing import Iterable
+
+# read-only id -> title catalog, built for millions of entries
+#
+# random.choice(list(data.items())) copies the whole dict on every pick, and a dict of millions of
+# str keys and values takes about 200 bytes an entry. the catalog is loaded once and keeps
+# everything in a few flat buffers instead:
+#   keys        the ids, utf-8, one after the other in a bytes blob, with their start offsets
+#   titles      the distinct titles (a title shared by an isbn and an imdb id is stored once) in a
+#               blob of their own, every entry has the number of its title
+#   slots       an open addressing hash table over the entries, lookups compare the stored hash
+#               (its low 32 bits) first and only decode the key when it is equal
+# the entries are grouped by namespace (the part of the id before the first "-", "isbn" or "imdb"),
+# so a namespace is a range of entry numbers: counting, sampling and paging one is O(1).
+# sampling picks a random entry number, O(1) whatever the size.
+
+
+class Catalog:
+    def __init__(self, items: Iterable[tuple[str, str]] = ()):
+        # per namespace: the key blob, and the key lengths, hashes and title numbers
+        groups: dict[str, tuple[bytearray, array, array, array]] = {}
+        title_numbers: dict[str, int] = {}
+        title_blob = bytearray()
+        title_lengths = array("q")
+
+        for key, title in items:
+            head, dash, _ = key.partition("-")
+            namespace = head if dash else ""
+            group = groups.get(namespace)
+            if group is None:
+                group = groups[namespace] = (bytearray(), array("q"), array("I"), array("I"))
+            blob, lengths, hashes, titles = group
+            number = title_numbers.get(title)
+            if number is None:
+                number = title_numbers[title] = len(title_lengths)
+                encoded = title.encode()
+                title_blob += encoded
+                title_lengths.append(len(encoded))
+            encoded = key.encode()
+            blob += encoded
+            lengths.append(len(encoded))
+            hashes.append(hash(key) & 0xFFFFFFFF)
+            titles.append(number)
+        del title_numbers
+
+        self.namespaces: dict[str, range] = {}
+        start = 0
+        for namespace in sorted(groups):
+            stop = start + len(groups[namespace][1])
+            self.namespaces[namespace] = range(start, stop)
+            start = stop
+        self.keys = b"".join(groups[namespace][0] for namespace in self.namespaces)
+        key_lengths = array("q")
+        self.hashes = array("I")
+        self.title_numbers = array("I")
+        for namespace in self.namespaces:
+            _, lengths, hashes, titles = groups.pop(namespace)
+            key_lengths += lengths
+            self.hashes += hashes
+            self.title_numbers += titles
+        self.key_offsets = array("q", accumulate(key_lengths, initial=0))
+        del key_lengths
+        self.titles = bytes(title_blob)
+        self.title_offsets = array("q", accumulate(title_lengths, initial=0))
+
+        # at most half full, so a miss ends after a couple of probes
+        size = 8
+        while size < 2 * len(self.hashes):
+            size *= 2
+        self.mask = mask = size - 1
+        self.slots = slots = array("i", [-1]) * size
+        hashes = self.hashes
+        # an id that is listed twice is looked up as its last entry, the earlier one is dead and
+        # skipped when sampling
+        self.dead: set[int] = set()
+        for entry, key_hash in enumerate(hashes):
+            i = key_hash & mask
+            while True:
+                other = slots[i]
+                if other < 0:
+                    slots[i] = entry
+                    break
+                if hashes[other] == key_hash and self._key(other) == self._key(entry):
+                    slots[i] = entry
+                    self.dead.add(other)
+                    break
+                i = (i + 1) & mask
+        self.counts = {
+            namespace: len(entries) - sum(1 for entry in self.dead if entry in entries)
+            for namespace, entries in self.namespaces.items()
+        }
+
+    @classmethod
+    def from_file(cls, path: str) -> "Catalog":
+        # one "<id>\t<title>" per line
+        def read():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    key, tab, title = line.rstrip("\n").partition("\t")
+                    if tab:
+                        yield key, title
+
+        return cls(read())
+
+    def __len__(self):
+        return len(self.hashes) - len(self.dead)
+
+    def __contains__(self, key: str) -> bool:
+        return self._find(key) >= 0
+
+    def _key(self, entry: int) -> str:
+        return self.keys[self.key_offsets[entry] : self.key_offsets[entry + 1]].decode()
+
+    def _title(self, entry: int) -> str:
+        number = self.title_numbers[entry]
+        return self.titles[self.title_offsets[number] : self.title_offsets[number + 1]].decode()
+
+    def _find(self, key: str) -> int:
+        key_hash = hash(key) & 0xFFFFFFFF
+        slots, hashes, mask = self.slots, self.hashes, self.mask
+        i = key_hash & mask
+        while True:
+            entry = slots[i]
+            if entry < 0:
+                return -1
+            if hashes[entry] == key_hash and self._key(entry) == key:
+                return entry
+            i = (i + 1) & mask
+
+    def get(self, key: str) -> str | None:
+        entry = self._find(key)
+        return self._title(entry) if entry >= 0 else None
+
+    def count(self, namespace: str | None = None) -> int:
+        if namespace is None:
+            return len(self)
+        return self.counts.get(namespace, 0)
+
+    def sample(self, namespace: str | None = None, rng: random.Random = random) -> tuple[str, str]:
+        # raises KeyError when there is nothing to pick from
+        if self.count(namespace) == 0:
+            raise KeyError(namespace)
+        entries = range(len(self.hashes)) if namespace is None else self.namespaces[namespace]
+        while True:
+            entry = entries[rng.randrange(len(entries))]
+            if entry not in self.dead:
+                return self._key(entry), self._title(entry)
+
+    def page(self, namespace: str, offset: int = 0, limit: int = 100) -> list[tuple[str, str]]:
+        # in the order of the file
+        entries = self.namespaces.get(namespace, range(0))[offset : offset + limit]
+        return [
+            (self._key(entry), self._title(entry)) for entry in entries if entry not in self.dead
+        ]
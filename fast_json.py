@@ -0,0 +1,57 @@
+from operator import attrgetter
+from typing import Any, TypedDict
+
+import pydantic_core
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+# json responses rendered by pydantic-core (rust) instead of json.dumps
+#
+# app = FastAPI(default_response_class=FastJSONResponse) makes it the default for every route,
+# a route that needs the standard one opts out with response_class=JSONResponse.
+#
+# pydantic-core serializes datetime, date, time, UUID, Decimal, Enum, set, frozenset, bytes,
+# dataclasses and pydantic models (nested ones too) by itself. when a route returns plain data,
+# FastAPI still runs jsonable_encoder over it before the response class gets it, returning
+# FastJSONResponse(content) from the route skips that walk as well.
+# timedeltas are written as seconds (a float) like jsonable_encoder does, NaN and infinity as
+# null, json.dumps would raise for them.
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content, timedelta_mode="float", inf_nan_mode="null")
+
+
+# list endpoints with a response_model
+# a route declared with response_model=list[HeroPublic] that returns ORM rows has FastAPI validate
+# every row into a new HeroPublic (from_attributes), dump those to python again and then to json.
+# pydantic's from_attributes only exists for validation, and building the model instances is most
+# of the cost. RowSerializer reads the model's fields straight off the rows instead and dumps them
+# with a TypeAdapter prebuilt from the same fields, so rows go to json bytes in one pydantic-core
+# pass, without any model instance. the rows are trusted to have the right types already (they
+# come out of typed columns), nothing is validated, and the fields must be plain values, not
+# nested models. the route keeps response_model for the docs and returns
+# Response(serializer.dump_json(rows), media_type="application/json").
+
+
+class RowSerializer:
+    def __init__(self, model: type[BaseModel]):
+        self.attributes = tuple(model.model_fields)
+        # by alias, like FastAPI does
+        self.keys = tuple(
+            field.serialization_alias or field.alias or name
+            for name, field in model.model_fields.items()
+        )
+        self.get = attrgetter(*self.attributes)
+        row = TypedDict(
+            f"{model.__name__}Row",
+            {key: field.annotation for key, field in zip(self.keys, model.model_fields.values())},
+        )
+        self.adapter = TypeAdapter(list[row])
+
+    def dump_json(self, rows) -> bytes:
+        keys, get = self.keys, self.get
+        if len(keys) == 1:
+            return self.adapter.dump_json([{keys[0]: get(row)} for row in rows])
+        return self.adapter.dump_json([dict(zip(keys, get(row))) for row in rows])
@@ -0,0 +1,61 @@
+import base64
+import json
+from typing import Literal
+
+from fastapi import HTTPException
+from sqlmodel import SQLModel, select, tuple_
+
+# keyset (cursor) pagination for the hero services (42_sql_relational_databases*.py)
+# offset makes sqlite walk and throw away every skipped row, so deep pages get slower and slower.
+# the cursor remembers the last row of the page instead, and the next page starts right after it
+# using the index on the sort column: WHERE (name, id) > (:name, :id) ORDER BY name, id
+# the next cursor is sent back in the X-Next-Cursor header, so the response body stays list[HeroPublic]
+#
+# sqlite sorts NULL ages first, so after a NULL age come the rest of the NULLs and then every age.
+# one query with WHERE age IS NOT NULL OR id > :id can't use the index as a range and scans it
+# from the start, so that page is two queries, each a range of the age index:
+#   age IS NULL AND id > :id ORDER BY id, then age IS NOT NULL ORDER BY age, id
+# select_heroes_after returns the statements, the caller runs them in order until the page is full.
+
+HeroOrder = Literal["id", "name", "age"]
+
+
+def encode_cursor(order_by: HeroOrder, hero: SQLModel) -> str:
+    payload = json.dumps([order_by, getattr(hero, order_by), hero.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, order_by: HeroOrder):
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_order_by, value, hero_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    value_types = {"id": int, "name": str, "age": int | None}
+    if (
+        cursor_order_by != order_by
+        or not isinstance(hero_id, int)
+        or not isinstance(value, value_types[order_by])
+    ):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, hero_id
+
+
+def select_heroes_after(hero: type[SQLModel], order_by: HeroOrder, cursor: str | None) -> list:
+    if order_by == "id":
+        statement = select(hero).order_by(hero.id)
+    else:
+        column = getattr(hero, order_by)
+        statement = select(hero).order_by(column, hero.id)
+    if cursor is None:
+        return [statement]
+
+    value, hero_id = decode_cursor(cursor, order_by)
+    if order_by == "id":
+        return [statement.where(hero.id > hero_id)]
+    if value is None:
+        return [
+            select(hero).where(column.is_(None), hero.id > hero_id).order_by(hero.id),
+            statement.where(column.is_not(None)),
+        ]
+    return [statement.where(tuple_(column, hero.id) > (value, hero_id))]
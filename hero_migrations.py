@@ -0,0 +1,37 @@
+from sqlalchemy import Table, inspect
+
+# schema upgrades for the hero table, shared by the hero services (42_sql_relational_databases*.py),
+# which all use the same database.db
+#
+# the etags are "<id>.<version>", so an id must never be given out again and every write must bump
+# the version. hero tables created before that have no version column, and no AUTOINCREMENT:
+# without it sqlite gives the id of the deleted hero with the highest id to the next new hero,
+# whose etag can then be the same as the deleted hero's.
+# sqlite can't add AUTOINCREMENT to an existing table, so the table is rebuilt: the old one is
+# renamed, the new one is created from the model (with its indexes), the rows are copied over with
+# their ids, and the triggers of the old table (the fts ones) are created again on the new one.
+
+
+def upgrade_hero_table(conn, hero_table: Table):
+    sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'hero'"
+    ).scalar()
+    columns = [column["name"] for column in inspect(conn).get_columns("hero")]
+    if "AUTOINCREMENT" in sql.upper():
+        if "version" not in columns:
+            conn.exec_driver_sql("ALTER TABLE hero ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        return
+
+    triggers = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'hero'"
+    ).scalars().all()
+    conn.exec_driver_sql("ALTER TABLE hero RENAME TO hero_old")
+    # the index names are the ones the new table gets
+    for index in inspect(conn).get_indexes("hero_old"):
+        conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+    hero_table.create(conn)
+    names = ", ".join(f'"{name}"' for name in columns if name in hero_table.c)
+    conn.exec_driver_sql(f"INSERT INTO hero ({names}) SELECT {names} FROM hero_old")
+    conn.exec_driver_sql("DROP TABLE hero_old")
+    for trigger in triggers:
+        conn.exec_driver_sql(trigger)
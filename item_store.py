@@ -0,0 +1,223 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Iterable, Literal
+
+# in-memory item store
+#
+# the items are kept by id, with an inverted index from every tag to the ids of the items that have
+# it (the tag's postings) and a sorted index per timestamp. a query for the items that have all of
+# some tags, ordered by created_at or updated_at, one page at a time, is answered from the indexes
+# without looking at every item:
+#   no tags         the page is a slice of the sorted index
+#   rare tags       intersect the postings, smallest first, and keep the first ones of the matches
+#                   in timestamp order (a heap, only offset + limit of them are needed)
+#   common tags     walk the sorted index in order and keep the ids that are in every posting, it
+#                   stops as soon as the page is full, which is soon when most items match
+# the planner guesses how many items match from the posting sizes (as if the tags were independent)
+# and picks the cheaper of the last two. both give the same page, ties between equal timestamps
+# are ordered by id.
+
+OrderBy = Literal["created_at", "updated_at"]
+
+# rough cost of the work per id, relative to each other, measured with benchmarks/item_store.py
+INTERSECT_COST = 1  # per id of the smallest posting
+HEAP_COST = 4  # per match pushed through the heap
+SCAN_COST = 3  # per id of the sorted index walked
+
+
+@dataclass(slots=True)
+class StoredItem:
+    id: int
+    data: dict[str, Any]
+    tags: tuple[str, ...]
+    created_at: datetime
+    updated_at: datetime
+
+
+class SortedIndex:
+    # (timestamp, id) in order, as two parallel arrays of machine numbers, 16 bytes an item
+    def __init__(self):
+        self.keys = array("d")
+        self.ids = array("q")
+
+    def __len__(self):
+        return len(self.ids)
+
+    def insert(self, key: float, item_id: int):
+        i = bisect_right(self.keys, key)
+        if i == len(self.keys):
+            # the usual case, a new item or an update is the latest one
+            self.keys.append(key)
+            self.ids.append(item_id)
+            return
+        while i > 0 and self.keys[i - 1] == key and self.ids[i - 1] > item_id:
+            i -= 1
+        self.keys.insert(i, key)
+        self.ids.insert(i, item_id)
+
+    def remove(self, key: float, item_id: int):
+        i = bisect_left(self.keys, key)
+        while self.ids[i] != item_id:
+            i += 1
+        del self.keys[i]
+        del self.ids[i]
+
+    def load(self, entries: list[tuple[float, int]]):
+        entries.sort()
+        self.keys = array("d", (key for key, _ in entries))
+        self.ids = array("q", (item_id for _, item_id in entries))
+
+
+class ItemStore:
+    def __init__(self):
+        self.items: dict[int, StoredItem] = {}
+        self.postings: dict[str, set[int]] = {}
+        self.indexes: dict[str, SortedIndex] = {
+            "created_at": SortedIndex(),
+            "updated_at": SortedIndex(),
+        }
+        self.next_id = 1
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, item_id: int) -> StoredItem | None:
+        return self.items.get(item_id)
+
+    def _new_item(self, data: dict[str, Any], tags: Iterable[str], created_at: datetime):
+        item = StoredItem(self.next_id, data, tuple(dict.fromkeys(tags)), created_at, created_at)
+        self.next_id += 1
+        self.items[item.id] = item
+        for tag in item.tags:
+            self.postings.setdefault(tag, set()).add(item.id)
+        return item
+
+    def add(
+        self, data: dict[str, Any], tags: Iterable[str] = (), created_at: datetime | None = None
+    ) -> StoredItem:
+        created_at = created_at or datetime.now(timezone.utc)
+        with self._lock:
+            item = self._new_item(data, tags, created_at)
+            key = created_at.timestamp()
+            self.indexes["created_at"].insert(key, item.id)
+            self.indexes["updated_at"].insert(key, item.id)
+            return item
+
+    def load(self, items: Iterable[tuple[dict[str, Any], Iterable[str], datetime]]):
+        # bulk load of (data, tags, created_at), the sorted indexes are built with one sort at the
+        # end instead of inserting into them item by item
+        with self._lock:
+            for data, tags, created_at in items:
+                self._new_item(data, tags, created_at)
+            for name, index in self.indexes.items():
+                index.load(
+                    [(getattr(item, name).timestamp(), item.id) for item in self.items.values()]
+                )
+
+    def update(
+        self,
+        item_id: int,
+        data: dict[str, Any] | None = None,
+        tags: Iterable[str] | None = None,
+    ) -> StoredItem | None:
+        with self._lock:
+            item = self.items.get(item_id)
+            if item is None:
+                return None
+            if data is not None:
+                item.data = data
+            if tags is not None:
+                self._unindex_tags(item)
+                item.tags = tuple(dict.fromkeys(tags))
+                for tag in item.tags:
+                    self.postings.setdefault(tag, set()).add(item.id)
+            index = self.indexes["updated_at"]
+            index.remove(item.updated_at.timestamp(), item.id)
+            item.updated_at = datetime.now(timezone.utc)
+            index.insert(item.updated_at.timestamp(), item.id)
+            return item
+
+    def remove(self, item_id: int) -> StoredItem | None:
+        with self._lock:
+            item = self.items.pop(item_id, None)
+            if item is None:
+                return None
+            self._unindex_tags(item)
+            self.indexes["created_at"].remove(item.created_at.timestamp(), item.id)
+            self.indexes["updated_at"].remove(item.updated_at.timestamp(), item.id)
+            return item
+
+    def _unindex_tags(self, item: StoredItem):
+        for tag in item.tags:
+            posting = self.postings[tag]
+            posting.discard(item.id)
+            if not posting:
+                del self.postings[tag]
+
+    def plan(self, tags: Iterable[str], offset: int = 0, limit: int = 100) -> str:
+        # "index", "empty", "intersect" or "scan"
+        return self._plan(self._postings(tags), offset + limit)
+
+    def _postings(self, tags: Iterable[str]) -> list[set[int]]:
+        empty: set[int] = set()
+        return sorted((self.postings.get(tag, empty) for tag in set(tags)), key=len)
+
+    def _plan(self, postings: list[set[int]], wanted: int) -> str:
+        if not postings:
+            return "index"
+        if not postings[0]:
+            return "empty"
+        total = len(self.items)
+        expected = float(total)
+        for posting in postings:
+            expected *= len(posting) / total
+        intersect = len(postings[0]) * INTERSECT_COST + expected * HEAP_COST
+        scan = min(total, wanted * total / max(expected, 1.0)) * SCAN_COST
+        return "scan" if scan < intersect else "intersect"
+
+    def query(
+        self,
+        tags: Iterable[str] = (),
+        order_by: OrderBy = "created_at",
+        offset: int = 0,
+        limit: int = 100,
+    ) -> list[StoredItem]:
+        with self._lock:
+            items = self.items
+            index = self.indexes[order_by]
+            postings = self._postings(tags)
+            plan = self._plan(postings, offset + limit)
+
+            if plan == "index":
+                return [items[item_id] for item_id in index.ids[offset : offset + limit]]
+            if plan == "empty":
+                return []
+
+            if plan == "intersect":
+                matches = postings[0].intersection(*postings[1:])
+                first = heapq.nsmallest(
+                    offset + limit,
+                    matches,
+                    key=lambda item_id: (getattr(items[item_id], order_by), item_id),
+                )
+                return [items[item_id] for item_id in first[offset:]]
+
+            page = []
+            skip = offset
+            for item_id in index.ids:
+                for posting in postings:
+                    if item_id not in posting:
+                        break
+                else:
+                    if skip:
+                        skip -= 1
+                        continue
+                    page.append(items[item_id])
+                    if len(page) == limit:
+                        break
+            return page
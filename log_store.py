@@ -0,0 +1,622 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Literal
+
+# embedded append-only key-value store
+#
+# every put or delete appends a record to the end of the active segment file, nothing is ever
+# written in place. an in-memory dict maps every key to where its latest record is (segment, offset
+# and size packed in one int), so a read is one dict lookup and one read of the record: sealed
+# segments are read through mmap, the active one with pread.
+#
+#   record   crc32 | value length | key length | key | value
+#            the crc covers everything after it. the value length is TOMBSTONE for a delete
+#
+# crashes: a segment is only ever appended to, so a crash can only leave a torn record at the end
+# of the active segment. opening the store replays the segments in order to rebuild the index,
+# checking every crc, and cuts the active segment off at the first bad record. writes go straight
+# to the os (no buffering in the process), so a killed process loses nothing. surviving a power
+# loss needs the data on disk, that's the sync mode:
+#   "always"  fsync after every write
+#   "batch"   a flusher thread fsyncs whenever something was written, the writes that come in
+#             during an fsync all go in the next one. a put(durable=True) waits for the fsync that
+#             covers it (group commit). `sync_interval` makes it wait that long before an fsync to
+#             gather more writes, worth it when an fsync is slow
+#   "never"   leave it to the os
+#
+# compaction: overwritten and deleted records stay in the files until a background thread rewrites
+# the sealed segments (every one but the active) when at least `compact_ratio` of their bytes are
+# dead. the live records are copied into a new file that replaces the newest sealed segment, the
+# older ones are then deleted. the new file starts with a record that says which segments it
+# replaces, so if the process dies before they are deleted they are ignored (and deleted) on the
+# next open, their stale records never come back.
+#
+# one process: the index and the active segment's end live in the process that opened the store,
+# a second process appending to the same files would write over its records. opening takes an
+# exclusive flock on the LOCK file in the directory and fails with StoreLockedError while another
+# process has it, so a server using the store runs with one worker. the os drops the lock when the
+# process dies, a crash doesn't leave the store locked.
+#
+# values are encoded with encode_value, a compact binary encoding that keeps datetime and date as
+# numbers (12 and 5 bytes) instead of iso strings.
+
+# record header: crc, value length, key length
+HEADER = struct.Struct("<IIH")
+TOMBSTONE = 0xFFFFFFFF
+SEGMENT_SIZE = 64 * 1024 * 1024
+SYNC_INTERVAL = 0.0  # seconds
+COMPACT_RATIO = 0.5
+COMPACT_INTERVAL = 30.0  # seconds
+# sealed segments smaller than this together are not worth compacting
+COMPACT_MIN_BYTES = 4 * 1024 * 1024
+
+OFFSET_BITS = 40
+SEGMENT_BITS = 24
+
+
+def pack_position(segment: int, offset: int, size: int) -> int:
+    return (size << (OFFSET_BITS + SEGMENT_BITS)) | (segment << OFFSET_BITS) | offset
+
+
+def unpack_position(position: int) -> tuple[int, int, int]:
+    return (
+        (position >> OFFSET_BITS) & ((1 << SEGMENT_BITS) - 1),
+        position & ((1 << OFFSET_BITS) - 1),
+        position >> (OFFSET_BITS + SEGMENT_BITS),
+    )
+
+
+# values
+# one tag byte, then:
+#   n t f           None, True, False
+#   i q             int, 4 or 8 bytes (I and its digits as a str for the ones that don't fit)
+#   g               float, 8 bytes
+#   s S             str (utf-8): the length, 1 byte (s) or 4 (S), then the bytes
+#   y Y             bytes, the same way
+#   m M             dict (str keys): the count, 1 byte (m) or 4 (M), then key, value, key...
+#   l L             list, the count the same way, then the items
+#   T               datetime: microseconds since the epoch (utc), 8 bytes, and the utc offset in
+#                   seconds, 4 bytes, NAIVE for a datetime without tzinfo
+#   D               date: the proleptic ordinal, 4 bytes
+# an item with a title, a timestamp and no description takes 55 bytes, 72 as json
+
+INT32 = struct.Struct("<i")
+INT64 = struct.Struct("<q")
+FLOAT = struct.Struct("<d")
+LENGTH = struct.Struct("<I")
+DATETIME = struct.Struct("<qi")
+DATE = struct.Struct("<i")
+NAIVE = -(2**31)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+NAIVE_EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+SECOND = timedelta(seconds=1)
+
+
+def encode_value(value: Any) -> bytes:
+    out = bytearray()
+    _encode(value, out)
+    return bytes(out)
+
+
+def _encode_length(short: bytes, long: bytes, length: int, out: bytearray):
+    if length < 256:
+        out += short
+        out.append(length)
+    else:
+        out += long
+        out += LENGTH.pack(length)
+
+
+def _encode(value: Any, out: bytearray):
+    if value is None:
+        out += b"n"
+    elif value is True:
+        out += b"t"
+    elif value is False:
+        out += b"f"
+    elif isinstance(value, int):
+        if -(2**31) <= value < 2**31:
+            out += b"i"
+            out += INT32.pack(value)
+        elif -(2**63) <= value < 2**63:
+            out += b"q"
+            out += INT64.pack(value)
+        else:
+            out += b"I"
+            _encode(str(value), out)
+    elif isinstance(value, float):
+        out += b"g"
+        out += FLOAT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode()
+        _encode_length(b"s", b"S", len(data), out)
+        out += data
+    elif isinstance(value, dict):
+        _encode_length(b"m", b"M", len(value), out)
+        for key, item in value.items():
+            if not isinstance(key, str):
+                raise TypeError(f"dict keys must be str, not {type(key).__name__}")
+            _encode(key, out)
+            _encode(item, out)
+    elif isinstance(value, (list, tuple)):
+        _encode_length(b"l", b"L", len(value), out)
+        for item in value:
+            _encode(item, out)
+    elif isinstance(value, datetime):
+        offset = value.utcoffset()
+        out += b"T"
+        if offset is None:
+            out += DATETIME.pack((value - NAIVE_EPOCH) // MICROSECOND, NAIVE)
+        else:
+            out += DATETIME.pack((value - EPOCH) // MICROSECOND, offset // SECOND)
+    elif isinstance(value, date):
+        out += b"D"
+        out += DATE.pack(value.toordinal())
+    elif isinstance(value, (bytes, bytearray)):
+        _encode_length(b"y", b"Y", len(value), out)
+        out += value
+    else:
+        raise TypeError(f"can't encode {type(value).__name__}")
+
+
+def decode_value(data: bytes) -> Any:
+    value, end = _decode(data, 0)
+    if end != len(data):
+        raise ValueError("trailing data after the value")
+    return value
+
+
+def _decode(data: bytes, i: int) -> tuple[Any, int]:
+    tag = data[i]
+    i += 1
+    if tag in b"sSyYmMlL":
+        if tag in b"SYML":
+            (length,) = LENGTH.unpack_from(data, i)
+            i += 4
+        else:
+            length = data[i]
+            i += 1
+        if tag in b"sS":
+            return data[i : i + length].decode(), i + length
+        if tag in b"yY":
+            return data[i : i + length], i + length
+        if tag in b"mM":
+            result = {}
+            for _ in range(length):
+                key, i = _decode(data, i)
+                result[key], i = _decode(data, i)
+            return result, i
+        items = []
+        for _ in range(length):
+            item, i = _decode(data, i)
+            items.append(item)
+        return items, i
+    if tag == 0x6E:  # n
+        return None, i
+    if tag == 0x74:  # t
+        return True, i
+    if tag == 0x66:  # f
+        return False, i
+    if tag == 0x69:  # i
+        return INT32.unpack_from(data, i)[0], i + 4
+    if tag == 0x71:  # q
+        return INT64.unpack_from(data, i)[0], i + 8
+    if tag == 0x49:  # I
+        digits, i = _decode(data, i)
+        return int(digits), i
+    if tag == 0x67:  # g
+        return FLOAT.unpack_from(data, i)[0], i + 8
+    if tag == 0x54:  # T
+        micros, offset = DATETIME.unpack_from(data, i)
+        if offset == NAIVE:
+            return NAIVE_EPOCH + micros * MICROSECOND, i + 12
+        tz = timezone.utc if offset == 0 else timezone(offset * SECOND)
+        return (EPOCH + micros * MICROSECOND).astimezone(tz), i + 12
+    if tag == 0x44:  # D
+        return date.fromordinal(DATE.unpack_from(data, i)[0]), i + 4
+    raise ValueError(f"unknown tag {tag:#x}")
+
+
+class CorruptLogError(Exception):
+    pass
+
+
+class StoreLockedError(Exception):
+    pass
+
+
+def segment_name(segment: int) -> str:
+    return f"{segment:06d}.log"
+
+
+def fsync_directory(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class LogStore:
+    def __init__(
+        self,
+        path: str | os.PathLike,
+        sync: Literal["always", "batch", "never"] = "batch",
+        sync_interval: float = SYNC_INTERVAL,
+        segment_size: int = SEGMENT_SIZE,
+        compact_ratio: float = COMPACT_RATIO,
+        compact_interval: float | None = COMPACT_INTERVAL,
+    ):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._lock_fd = os.open(self.path / "LOCK", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(self._lock_fd)
+            raise StoreLockedError(f"{self.path} is open in another process")
+        self.sync = sync
+        self.sync_interval = sync_interval
+        self.segment_size = segment_size
+        self.compact_ratio = compact_ratio
+
+        self.index: dict[str, int] = {}
+        # per segment: its size and how many of its bytes are stale records
+        self.sizes: dict[int, int] = {}
+        self.dead: dict[int, int] = {}
+        self.maps: dict[int, mmap.mmap] = {}
+        self.syncs = 0
+        self.compactions = 0
+        self.written = 0  # sequence number of the last write
+        self.synced = 0  # every write up to this one is on disk
+        self._lock = threading.Lock()
+        # held around an fsync of the active file, so it isn't closed under it
+        self._sync_lock = threading.Lock()
+        self._synced = threading.Condition()
+        self._compact_lock = threading.Lock()
+        self._closed = threading.Event()
+
+        try:
+            self._recover()
+        except BaseException:
+            os.close(self._lock_fd)
+            raise
+        self._threads = []
+        if sync == "batch":
+            self._threads.append(
+                threading.Thread(target=self._run_sync, name="log-sync", daemon=True)
+            )
+        if compact_interval:
+            self._threads.append(
+                threading.Thread(
+                    target=self._run_compaction,
+                    args=(compact_interval,),
+                    name="log-compact",
+                    daemon=True,
+                )
+            )
+        for thread in self._threads:
+            thread.start()
+
+    # opening
+
+    def _recover(self):
+        for leftover in self.path.glob("*.compact"):
+            # a compaction that didn't finish, the segments it was made from are all still there
+            leftover.unlink()
+        segments = sorted(int(file.name.split(".")[0]) for file in self.path.glob("*.log"))
+        # a compacted segment replaces the ones before it down to the one in its first record,
+        # they are still there when the process died before deleting them
+        replaced = set()
+        for segment in segments:
+            first = self._replaces(segment)
+            if first is not None:
+                replaced.update(range(first, segment))
+        for segment in replaced.intersection(segments):
+            (self.path / segment_name(segment)).unlink()
+        segments = [segment for segment in segments if segment not in replaced]
+
+        for segment in segments:
+            self._replay(segment, last=segment == segments[-1])
+        self._open_active(segments[-1] if segments else 1)
+
+    def _replaces(self, segment: int) -> int | None:
+        with open(self.path / segment_name(segment), "rb") as f:
+            head = f.read(HEADER.size + LENGTH.size)
+        if len(head) < HEADER.size + LENGTH.size:
+            return None
+        crc, value_length, key_length = HEADER.unpack_from(head)
+        if key_length or value_length != LENGTH.size or zlib.crc32(head[4:]) != crc:
+            return None
+        return LENGTH.unpack_from(head, HEADER.size)[0]
+
+    def _replay(self, segment: int, last: bool):
+        file = self.path / segment_name(segment)
+        size = file.stat().st_size
+        self.sizes[segment] = 0
+        self.dead[segment] = 0
+        if size == 0:
+            return
+        with open(file, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        while offset < size:
+            record = self._read_record(data, offset, size)
+            if record is None:
+                if not last:
+                    data.close()
+                    raise CorruptLogError(f"bad record in {file} at offset {offset}")
+                # a torn write at the end of the log, the write never completed
+                with open(file, "r+b") as f:
+                    f.truncate(offset)
+                    os.fsync(f.fileno())
+                break
+            key, value_length, record_size = record
+            # an empty key is the first record of a compacted segment
+            if key:
+                old = self.index.pop(key, None)
+                if old is not None:
+                    self._mark_dead(old)
+                if value_length == TOMBSTONE:
+                    self.dead[segment] += record_size
+                else:
+                    self.index[key] = pack_position(segment, offset, record_size)
+            offset += record_size
+            self.sizes[segment] = offset
+        if last:
+            # it becomes the active segment, read with pread
+            data.close()
+        else:
+            self.maps[segment] = data
+
+    @staticmethod
+    def _read_record(data, offset: int, size: int) -> tuple[str, int, int] | None:
+        # (key, value length, record size), or None for a torn or corrupt record
+        if offset + HEADER.size > size:
+            return None
+        crc, value_length, key_length = HEADER.unpack_from(data, offset)
+        record_size = HEADER.size + key_length + (0 if value_length == TOMBSTONE else value_length)
+        if offset + record_size > size:
+            return None
+        if zlib.crc32(data[offset + 4 : offset + record_size]) != crc:
+            return None
+        key = data[offset + HEADER.size : offset + HEADER.size + key_length].decode()
+        return key, value_length, record_size
+
+    def _open_active(self, segment: int):
+        self.active = segment
+        self.sizes.setdefault(segment, 0)
+        self.dead.setdefault(segment, 0)
+        self.file = open(self.path / segment_name(segment), "a+b", buffering=0)
+        self.fd = self.file.fileno()
+
+    # writes
+
+    def _mark_dead(self, position: int):
+        segment, _, size = unpack_position(position)
+        self.dead[segment] += size
+
+    def _append(self, key: str, value: bytes | None) -> int:
+        key_bytes = key.encode()
+        if not key_bytes:
+            raise ValueError("the key can't be empty")
+        if len(key_bytes) > 0xFFFF:
+            raise ValueError("the key is longer than 65535 bytes")
+        value_length = TOMBSTONE if value is None else len(value)
+        body = struct.pack("<IH", value_length, len(key_bytes)) + key_bytes + (value or b"")
+        record = LENGTH.pack(zlib.crc32(body)) + body
+        with self._lock:
+            size = self.sizes[self.active]
+            if size and size + len(record) > self.segment_size:
+                self._rollover()
+            offset = self.sizes[self.active]
+            self.file.write(record)
+            self.sizes[self.active] = offset + len(record)
+            old = self.index.pop(key, None)
+            if old is not None:
+                self._mark_dead(old)
+            if value is None:
+                self.dead[self.active] += len(record)
+            else:
+                self.index[key] = pack_position(self.active, offset, len(record))
+            self.written += 1
+            return self.written
+
+    def put(self, key: str, value: Any, durable: bool = True):
+        self._after_write(self._append(key, encode_value(value)), durable)
+
+    def delete(self, key: str, durable: bool = True) -> bool:
+        with self._lock:
+            if key not in self.index:
+                return False
+        self._after_write(self._append(key, None), durable)
+        return True
+
+    def _after_write(self, sequence: int, durable: bool):
+        if self.sync == "always":
+            self._fsync()
+        elif self.sync == "batch" and durable:
+            with self._synced:
+                self._synced.notify_all()
+                while self.synced < sequence and not self._closed.is_set():
+                    self._synced.wait()
+
+    def _fsync(self):
+        with self._lock:
+            target = self.written
+        with self._sync_lock:
+            os.fsync(self.fd)
+        with self._synced:
+            self.syncs += 1
+            self.synced = max(self.synced, target)
+            self._synced.notify_all()
+
+    def _run_sync(self):
+        while not self._closed.is_set():
+            with self._synced:
+                while self.synced >= self.written and not self._closed.is_set():
+                    self._synced.wait(timeout=1.0)
+            if self.sync_interval:
+                time.sleep(self.sync_interval)
+            self._fsync()
+
+    def _rollover(self):
+        # called with the lock held. the active file is swapped under the sync lock, so the
+        # flusher never fsyncs a closed file
+        sealed = self.active
+        with self._sync_lock:
+            os.fsync(self.fd)
+            self.file.close()
+            self._open_active(sealed + 1)
+        with open(self.path / segment_name(sealed), "rb") as f:
+            self.maps[sealed] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fsync_directory(self.path)
+
+    # reads
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            position = self.index.get(key)
+            if position is None:
+                return default
+            segment, offset, size = unpack_position(position)
+            if segment == self.active:
+                record = os.pread(self.fd, size, offset)
+            else:
+                record = self.maps[segment][offset : offset + size]
+        (key_length,) = struct.unpack_from("<H", record, 8)
+        return decode_value(record[HEADER.size + key_length :])
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            return list(self.index)
+
+    # compaction
+
+    def _run_compaction(self, interval: float):
+        while not self._closed.wait(interval):
+            if self._should_compact():
+                self.compact()
+
+    def _should_compact(self) -> bool:
+        with self._lock:
+            sealed = [segment for segment in self.sizes if segment != self.active]
+            total = sum(self.sizes[segment] for segment in sealed)
+            dead = sum(self.dead[segment] for segment in sealed)
+        return total >= COMPACT_MIN_BYTES and dead >= total * self.compact_ratio
+
+    def compact(self):
+        with self._compact_lock:
+            with self._lock:
+                sealed = sorted(segment for segment in self.sizes if segment != self.active)
+                maps = {segment: self.maps.get(segment) for segment in sealed}
+            if not sealed:
+                return
+            target = sealed[-1]
+            temp = self.path / f"{target:06d}.compact"
+            moved = []
+            with open(temp, "wb") as out:
+                body = struct.pack("<IH", LENGTH.size, 0) + LENGTH.pack(sealed[0])
+                out.write(LENGTH.pack(zlib.crc32(body)) + body)
+                offset = len(body) + 4
+                for segment in sealed:
+                    data = maps[segment]
+                    if data is None:
+                        continue
+                    position = 0
+                    size = self.sizes.get(segment, 0)
+                    while position < size:
+                        crc, value_length, key_length = HEADER.unpack_from(data, position)
+                        record_size = HEADER.size + key_length
+                        if value_length != TOMBSTONE:
+                            record_size += value_length
+                        if key_length and value_length != TOMBSTONE:
+                            key = data[position + HEADER.size : position + HEADER.size + key_length]
+                            key = key.decode()
+                            old = pack_position(segment, position, record_size)
+                            # a record that is still the latest one for its key, checked again
+                            # below, the key can be written while this runs
+                            if self.index.get(key) == old:
+                                out.write(data[position : position + record_size])
+                                moved.append((key, old, pack_position(target, offset, record_size)))
+                                offset += record_size
+                        position += record_size
+                out.flush()
+                os.fsync(out.fileno())
+
+            with self._lock:
+                os.replace(temp, self.path / segment_name(target))
+                for segment in sealed:
+                    if segment in self.maps:
+                        self.maps.pop(segment).close()
+                    del self.sizes[segment]
+                    del self.dead[segment]
+                    if segment != target:
+                        (self.path / segment_name(segment)).unlink(missing_ok=True)
+                self.sizes[target] = offset
+                self.dead[target] = 0
+                with open(self.path / segment_name(target), "rb") as f:
+                    self.maps[target] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                for key, old, new in moved:
+                    if self.index.get(key) == old:
+                        self.index[key] = new
+                    else:
+                        self._mark_dead(new)
+                self.compactions += 1
+            fsync_directory(self.path)
+
+    # closing
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "keys": len(self.index),
+                "segments": len(self.sizes),
+                "active": self.active,
+                "bytes": sum(self.sizes.values()),
+                "dead_bytes": sum(self.dead.values()),
+                "writes": self.written,
+                "syncs": self.syncs,
+                "compactions": self.compactions,
+            }
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        with self._synced:
+            self._closed.set()
+            self._synced.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            with self._sync_lock:
+                os.fsync(self.fd)
+                self.file.close()
+            for data in self.maps.values():
+                data.close()
+            self.maps.clear()
+        with self._synced:
+            self.synced = self.written
+            self._synced.notify_all()
+        # closing the file releases the flock
+        os.close(self._lock_fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,14 +1,21 @@
+from contextlib import asynccontextmanager
+import os
 from enum import Enum
 from fastapi import FastAPI  # import fastapi
 from pydantic import BaseModel
 from typing import Annotated
-from fastapi import FastAPI, Query, Path
+from fastapi import FastAPI, HTTPException, Query, Path
 from pydantic import AfterValidator
 import random
 from pydantic import BaseModel, Field
 
 from typing import Annotated, Literal
 
+from catalog import Catalog
+from fast_json import FastJSONResponse
+from item_store import ItemStore
+from route_analysis import report_route_conflicts
+
 
 class ModelName(str, Enum):
     alexnet = "alexnet"
@@ -18,7 +25,20 @@ class ModelName(str, Enum):
 
 fake_items_db = [{"item_name": "Foo"}, {"item_name": "Bar"}, {"item_name": "Baz"}]
 
-app = FastAPI()  # init fastapi instance
+
+# at startup, print the routes that can never match (declared after a route that matches all
+# of their paths) and the ones that only work in their current order, see route_analysis.py
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global catalog
+    report_route_conflicts(app.routes)
+    if os.path.exists(CATALOG_FILE):
+        catalog = Catalog.from_file(CATALOG_FILE)
+    yield
+
+
+# responses are rendered by pydantic-core, see fast_json.py
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)  # init fastapi instance
 
 
 # ---------------------------------------------------------
@@ -176,11 +196,18 @@ class Item(BaseModel):
 
 @app.post("/items/")
 async def create_item(item: Item):
-    item_dict = item.dict()
+    # item_dict = item.dict()
+    # if item.tax is not None:
+    #     price_with_tax = item.price + item.tax
+    #     item_dict.update({"price_with_tax": price_with_tax})
+    # return item_dict
+
+    # .dict() is deprecated in pydantic v2, model_dump() replaces it. the dict is returned as a
+    # FastJSONResponse so FastAPI doesn't walk it with jsonable_encoder again
+    item_dict = item.model_dump()
     if item.tax is not None:
-        price_with_tax = item.price + item.tax
-        item_dict.update({"price_with_tax": price_with_tax})
-    return item_dict
+        item_dict["price_with_tax"] = item.price + item.tax
+    return FastJSONResponse(item_dict)
 
 
 # ---------------------------------------------------------
@@ -207,11 +234,11 @@ async def create_item(item: Item):
 async def update_item(item_id: int, item: Item, q: str | None = None):
     result = {
         "item_id": item_id,
-        **item.dict(),
+        **item.model_dump(),
     }  # merge contents from item's dictionary to result
     if q:
-        result.update({"q": q})
-    return result
+        result["q"] = q
+    return FastJSONResponse(result)
 
 
 # ---------------------------------------------------------
@@ -410,6 +437,30 @@ def check_valid_id(id: str):
     return id
 
 
+# the ids are served from a Catalog (see catalog.py): O(1) lookups and random picks, also within
+# one namespace, with millions of ids loaded from CATALOG_FILE ("<id>\t<title>" lines) at startup.
+# without the file it holds the three ids of `data`
+CATALOG_FILE = "catalog.tsv"
+catalog = Catalog(data.items())
+
+
+@app.get("/catalog/")
+async def read_catalog_item(
+    id: Annotated[str | None, AfterValidator(check_valid_id)] = None,
+    namespace: Literal["isbn", "imdb"] | None = None,
+):
+    if id:
+        item = catalog.get(id)
+        if item is None:
+            raise HTTPException(status_code=404, detail="Item not found")
+    else:
+        try:
+            id, item = catalog.sample(namespace)
+        except KeyError:
+            raise HTTPException(status_code=404, detail="Catalog is empty")
+    return {"id": id, "name": item}
+
+
 # @app.get("/items/")
 # async def read_items(
 #     id: Annotated[str | None, AfterValidator(check_valid_id)] = None,
@@ -488,7 +539,36 @@ class FilterParams(BaseModel):
     tags: list[str] = []
 
 
+# @app.get("/items/")
+# async def read_items(filter_query: Annotated[FilterParams, Query()]):
+#     return filter_query
+
+
+# the items live in an in-memory store with a tag index and sorted created_at/updated_at indexes,
+# the items that have all the tags come out in order one page at a time, see item_store.py
+item_store = ItemStore()
+for name, tags in [
+    ("Foo", ["rock", "metal"]),
+    ("Bar", ["rock"]),
+    ("Baz", ["jazz", "live"]),
+    ("Qux", ["rock", "live"]),
+]:
+    item_store.add({"name": name}, tags)
+
+
 @app.get("/items/")
 async def read_items(filter_query: Annotated[FilterParams, Query()]):
-    return filter_query
+    items = item_store.query(
+        filter_query.tags, filter_query.order_by, filter_query.offset, filter_query.limit
+    )
+    return [
+        {
+            "id": item.id,
+            **item.data,
+            "tags": item.tags,
+            "created_at": item.created_at,
+            "updated_at": item.updated_at,
+        }
+        for item in items
+    ]
 
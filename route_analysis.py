@@ -0,0 +1,267 @@
+import re
+from dataclasses import dataclass
+
+from starlette.convertors import CONVERTOR_TYPES
+from starlette.routing import BaseRoute, Match, Mount, Route, WebSocketRoute
+
+# route conflicts and a prefix tree over the routes
+#
+# starlette tries the routes one by one, in the order they were added, and the first one whose
+# path and method match handles the request. so a route declared after another one that matches
+# all of its paths with the same methods is dead (GET /items/{item_id} three times in main.py),
+# and two routes whose paths overlap only work as intended in one order (/users/me has to come
+# before /users/{user_id}).
+#
+# a path is split into segments, every segment is a literal ("users"), a parameter with a
+# convertor ("{user_id}" is str, "{item_id:int}") or a mix of both ("{name}.json"). a path
+# parameter ("{file_path:path}") matches any number of segments.
+
+
+@dataclass(frozen=True)
+class Segment:
+    kind: str  # "literal", "mixed" or a convertor name: "str", "int", "float", "uuid", "path"
+    value: str = ""  # the literal, or the regex of a mixed segment
+
+
+@dataclass
+class RouteConflict:
+    kind: str  # "shadowed", "order-dependent" or "ambiguous"
+    route: BaseRoute  # the route that is declared later
+    other: BaseRoute  # the route declared before it
+    methods: frozenset[str]
+
+    def __str__(self):
+        methods = ",".join(sorted(self.methods))
+        if self.kind == "shadowed":
+            return (
+                f"{methods} {describe(self.route)} is shadowed by {describe(self.other)}"
+                " declared before it and never matches"
+            )
+        if self.kind == "order-dependent":
+            return (
+                f"{methods} {describe(self.other)} only matches because it is declared before"
+                f" {describe(self.route)}"
+            )
+        return f"{methods} {describe(self.route)} and {describe(self.other)} match the same paths"
+
+
+param_segment = re.compile(r"^\{(\w+)(?::(\w+))?\}$")
+any_param = re.compile(r"\{(\w+)(?::(\w+))?\}")
+
+
+def parse_path(path: str) -> tuple[Segment, ...]:
+    segments = []
+    for part in path.split("/")[1:]:
+        match = param_segment.match(part)
+        if match:
+            segments.append(Segment(match.group(2) or "str"))
+        elif "{" in part:
+            regex = ""
+            last = 0
+            for param in any_param.finditer(part):
+                regex += re.escape(part[last : param.start()])
+                regex += f"(?:{CONVERTOR_TYPES[param.group(2) or 'str'].regex})"
+                last = param.end()
+            regex += re.escape(part[last:])
+            segments.append(Segment("mixed", regex))
+        else:
+            segments.append(Segment("literal", part))
+    return tuple(segments)
+
+
+convertor_patterns = {
+    name: re.compile(convertor.regex) for name, convertor in CONVERTOR_TYPES.items()
+}
+
+
+def segment_matches(segment: Segment, literal: str) -> bool:
+    if segment.kind == "literal":
+        return segment.value == literal
+    if segment.kind == "mixed":
+        return re.fullmatch(segment.value, literal) is not None
+    return convertor_patterns[segment.kind].fullmatch(literal) is not None
+
+
+# which convertors match every value of which other ones
+convertor_contains = {
+    "str": {"str", "int", "float", "uuid", "mixed"},
+    "float": {"float", "int"},
+    "int": {"int"},
+    "uuid": {"uuid"},
+}
+# pairs of convertors no value matches both of
+convertor_disjoint = {frozenset({"int", "uuid"}), frozenset({"float", "uuid"})}
+
+
+def segment_contains(a: Segment, b: Segment) -> bool:
+    if b.kind == "literal":
+        return segment_matches(a, b.value)
+    if a.kind in ("literal", "mixed"):
+        return a == b
+    return b.kind in convertor_contains.get(a.kind, {a.kind})
+
+
+def segment_overlaps(a: Segment, b: Segment) -> bool:
+    if a.kind == "literal":
+        return segment_matches(b, a.value)
+    if b.kind == "literal":
+        return segment_matches(a, b.value)
+    return frozenset({a.kind, b.kind}) not in convertor_disjoint
+
+
+def path_contains(a: tuple[Segment, ...], b: tuple[Segment, ...]) -> bool:
+    # every path that b matches is matched by a
+    if not a:
+        return not b
+    if a[0].kind == "path":
+        return any(path_contains(a[1:], b[i:]) for i in range(len(b) + 1))
+    if not b or b[0].kind == "path":
+        return False
+    return segment_contains(a[0], b[0]) and path_contains(a[1:], b[1:])
+
+
+def path_overlaps(a: tuple[Segment, ...], b: tuple[Segment, ...]) -> bool:
+    # some path is matched by both
+    if a and a[0].kind == "path":
+        if any(path_overlaps(a[1:], b[i:]) for i in range(len(b) + 1)):
+            return True
+    if b and b[0].kind == "path":
+        if any(path_overlaps(a[i:], b[1:]) for i in range(len(a) + 1)):
+            return True
+    if not a or not b:
+        return not a and not b
+    if a[0].kind == "path" or b[0].kind == "path":
+        return False
+    return segment_overlaps(a[0], b[0]) and path_overlaps(a[1:], b[1:])
+
+
+def describe(route: BaseRoute) -> str:
+    name = getattr(route, "name", None) or type(route).__name__
+    return f"{route.path} ({name})"
+
+
+def route_methods(route: BaseRoute) -> frozenset[str] | None:
+    if isinstance(route, Route):
+        return frozenset(route.methods or ())
+    if isinstance(route, WebSocketRoute):
+        return frozenset({"WEBSOCKET"})
+    return None
+
+
+def find_route_conflicts(routes: list[BaseRoute]) -> list[RouteConflict]:
+    # only routes that can match the same first segment are compared, so this stays far from
+    # comparing every pair on a big app. mounts are not looked into.
+    parsed = []
+    for route in routes:
+        methods = route_methods(route)
+        if methods is not None:
+            parsed.append((route, methods, parse_path(route.path)))
+
+    by_first: dict[str, list[int]] = {}
+    wildcard: list[int] = []
+    for i, (_, _, segments) in enumerate(parsed):
+        if segments and segments[0].kind == "literal":
+            by_first.setdefault(segments[0].value, []).append(i)
+        else:
+            wildcard.append(i)
+
+    conflicts = []
+    for i, (route, methods, segments) in enumerate(parsed):
+        if segments and segments[0].kind == "literal":
+            earlier = by_first.get(segments[0].value, []) + wildcard
+        else:
+            earlier = range(i)
+        for j in sorted(j for j in earlier if j < i):
+            other, other_methods, other_segments = parsed[j]
+            common = methods & other_methods
+            if not common or not path_overlaps(other_segments, segments):
+                continue
+            if path_contains(other_segments, segments):
+                # for the common methods only, the others still reach this route
+                kind = "shadowed"
+            elif path_contains(segments, other_segments):
+                kind = "order-dependent"
+            else:
+                kind = "ambiguous"
+            conflicts.append(RouteConflict(kind, route, other, common))
+            if kind == "shadowed" and common == methods:
+                break
+    return conflicts
+
+
+def report_route_conflicts(routes: list[BaseRoute]) -> list[RouteConflict]:
+    conflicts = find_route_conflicts(routes)
+    for conflict in conflicts:
+        print(f"route conflict: {conflict}")
+    return conflicts
+
+
+# prefix tree
+# every node has the literal segments that follow in a dict and the parameter segments next to it.
+# a request walks the tree with its path segments and only collects the routes it can reach,
+# usually a handful, whatever the number of routes. those candidates are then checked with
+# route.matches() in declaration order, like starlette's own loop, so the result is the same:
+# the first full match, otherwise the first partial (wrong method) match.
+
+
+class RouteNode:
+    __slots__ = ("literals", "params", "routes", "tails")
+
+    def __init__(self):
+        self.literals: dict[str, RouteNode] = {}
+        self.params: dict[Segment, RouteNode] = {}
+        # routes ending here and routes with a path parameter here (it matches any rest)
+        self.routes: list[tuple[int, BaseRoute]] = []
+        self.tails: list[tuple[int, BaseRoute]] = []
+
+
+class RouteIndex:
+    def __init__(self, routes: list[BaseRoute]):
+        self.root = RouteNode()
+        # mounts and hosts, always tried
+        self.unindexed: list[tuple[int, BaseRoute]] = []
+        for i, route in enumerate(routes):
+            if isinstance(route, Mount) or not hasattr(route, "path"):
+                self.unindexed.append((i, route))
+                continue
+            node = self.root
+            for segment in parse_path(route.path):
+                if segment.kind == "path":
+                    node.tails.append((i, route))
+                    break
+                if segment.kind == "literal":
+                    node = node.literals.setdefault(segment.value, RouteNode())
+                else:
+                    node = node.params.setdefault(segment, RouteNode())
+            else:
+                node.routes.append((i, route))
+
+    def candidates(self, path: str) -> list[tuple[int, BaseRoute]]:
+        parts = path.split("/")[1:]
+        found = list(self.unindexed)
+        stack = [(self.root, 0)]
+        while stack:
+            node, i = stack.pop()
+            found += node.tails
+            if i == len(parts):
+                found += node.routes
+                continue
+            part = parts[i]
+            child = node.literals.get(part)
+            if child is not None:
+                stack.append((child, i + 1))
+            for segment, child in node.params.items():
+                if segment_matches(segment, part):
+                    stack.append((child, i + 1))
+        found.sort(key=lambda item: item[0])
+        return found
+
+    def match(self, scope) -> tuple[Match, BaseRoute | None, dict]:
+        partial = None
+        for _, route in self.candidates(scope["path"]):
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return match, route, child_scope
+            if match == Match.PARTIAL and partial is None:
+                partial = (match, route, child_scope)
+        return partial or (Match.NONE, None, {})
@@ -0,0 +1,41 @@
+import importlib
+
+import pytest
+
+from benchmarks._common import use_users_db
+
+auth = importlib.import_module("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+
+
+@pytest.fixture
+def users_db(tmp_path):
+    use_users_db(auth, tmp_path / "users.db")
+    settings = auth.pwd_context.to_dict()
+    yield
+    auth.pwd_context.load(settings)
+    auth.engine.dispose()
+
+
+def test_every_worker_uses_the_stored_rounds(users_db, monkeypatch):
+    # the first worker measures 11 rounds, the next one (slower at that moment) would pick 10
+    monkeypatch.setattr(auth, "measure_bcrypt", lambda target_ms: (11, 120.0))
+    assert auth.calibrate_bcrypt(auth.BCRYPT_TARGET_MS) == 11
+    monkeypatch.setattr(auth, "measure_bcrypt", lambda target_ms: (10, 60.0))
+    assert auth.calibrate_bcrypt(auth.BCRYPT_TARGET_MS) == 11
+    assert auth.bcrypt_calibration["verify_ms"] == 120.0
+
+    new_hash = auth.get_password_hash("secret")
+    assert not auth.pwd_context.needs_update(new_hash)
+    assert auth.verify_and_update_password("secret", new_hash) == (True, None)
+
+
+def test_worker_losing_the_insert_uses_the_winners_rounds(users_db, monkeypatch):
+    def measure(target_ms):
+        # another worker stores its rounds while this one is still measuring
+        with auth.Session(auth.engine) as session:
+            session.add(auth.BcryptCost(rounds=12, verify_ms=240.0))
+            session.commit()
+        return 10, 60.0
+
+    monkeypatch.setattr(auth, "measure_bcrypt", measure)
+    assert auth.calibrate_bcrypt(auth.BCRYPT_TARGET_MS) == 12
@@ -0,0 +1,48 @@
+import importlib
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+heroes = importlib.import_module("42_sql_relational_databases")
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'database.db'}"
+    engine, read_engine = heroes.create_engines(url, heroes.sqlite_profile)
+    monkeypatch.setattr(heroes, "engine", engine)
+    monkeypatch.setattr(heroes, "read_engine", read_engine)
+    heroes.create_db_and_tables()
+    yield engine
+    engine.dispose()
+    read_engine.dispose()
+
+
+def test_rejected_chunk_is_retried_in_one_transaction(engine):
+    statements = []
+
+    @event.listens_for(engine, "connect")
+    def trace(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(statements.append)
+
+    engine.dispose()
+    rows = [
+        (0, {"name": "Deadpond", "secret_name": "Dive Wilson", "age": None}),
+        (1, {"name": None, "secret_name": "Tommy Sharp", "age": 48}),
+        (2, {"name": "Rusty-Man", "secret_name": "Tommy Sharp", "age": 48}),
+    ]
+    errors = heroes.insert_hero_rows(rows)
+    assert [error.index for error in errors] == [1]
+    with Session(engine) as session:
+        assert session.exec(select(heroes.Hero.name)).all() == ["Deadpond", "Rusty-Man"]
+
+    retry = statements[statements.index("ROLLBACK") + 1 :]
+    transaction = [sql for sql in retry if sql.split()[0] in ("BEGIN", "SAVEPOINT", "COMMIT")]
+    # the savepoints are inside the transaction, a RELEASE is not a commit of its own
+    assert transaction[0] == "BEGIN IMMEDIATE"
+    assert transaction[-1] == "COMMIT"
+    assert [sql for sql in transaction if sql.split()[0] in ("BEGIN", "COMMIT")] == [
+        "BEGIN IMMEDIATE",
+        "COMMIT",
+    ]
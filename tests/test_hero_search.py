@@ -0,0 +1,51 @@
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+heroes = importlib.import_module("42_sql_relational_databases")
+
+MAX = chr(0x10FFFF)
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    url = f"sqlite:///{tmp_path_factory.mktemp('heroes') / 'database.db'}"
+    engine, read_engine = heroes.create_engines(url, heroes.sqlite_profile)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(heroes, "engine", engine)
+        monkeypatch.setattr(heroes, "read_engine", read_engine)
+        with TestClient(heroes.app) as client:
+            for name in ("Spider", "Spiral", "Spj", f"a{MAX}z", MAX, "b"):
+                client.post("/heroes/", json={"name": name, "secret_name": "secret"})
+            yield client
+    engine.dispose()
+    read_engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "prefix, bound",
+    [
+        ("Spi", "Spj"),
+        (f"a{MAX}", "b"),
+        (f"a{MAX}{MAX}", "b"),
+        (MAX, None),
+        (chr(0xD7FF), chr(0xE000)),
+    ],
+)
+def test_prefix_upper_bound(prefix, bound):
+    assert heroes.prefix_upper_bound(prefix) == bound
+
+
+@pytest.mark.parametrize(
+    "prefix, names",
+    [
+        ("Spi", ["Spider", "Spiral"]),
+        (f"a{MAX}", [f"a{MAX}z"]),
+        (MAX, [MAX]),
+    ],
+)
+def test_search_name_prefix(client, prefix, names):
+    response = client.get("/heroes/search", params={"name_prefix": prefix})
+    assert response.status_code == 200
+    assert [hero["name"] for hero in response.json()] == names
@@ -0,0 +1,66 @@
+import importlib
+from datetime import timedelta
+
+import pytest
+from sqlmodel import SQLModel, create_engine
+
+auth = importlib.import_module("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+
+DAY = 24 * 60 * 60
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def key_ring(engine):
+    return auth.KeyRing(
+        engine,
+        auth.ALGORITHM,
+        rotate_after=timedelta(days=1),
+        keep_for=timedelta(days=7),
+        reload_after=timedelta(seconds=0),
+    )
+
+
+def test_keys_survive_a_restart(engine):
+    first = key_ring(engine)
+    first.rotate()
+    second = key_ring(engine)
+    second.rotate()
+    assert second.kid == first.kid
+    assert second.jwks() == first.jwks()
+
+
+def test_rotation_is_seen_by_other_workers(engine):
+    worker_a, worker_b = key_ring(engine), key_ring(engine)
+    worker_a.rotate()
+    worker_b.rotate()
+    old_kid = worker_a.kid
+    worker_a.created_at -= 2 * DAY
+    worker_a.rotate()
+    assert worker_a.kid != old_kid
+    assert worker_b.public_key(worker_a.kid) is None
+    worker_b.load()
+    assert worker_b.public_key(worker_a.kid) is not None
+    assert worker_b.public_key(old_kid) is not None
+    # the next rotation of worker b uses the key worker a added
+    worker_b.rotate()
+    assert worker_b.kid == worker_a.kid
+
+
+def test_retired_keys_are_dropped(engine):
+    ring = key_ring(engine)
+    ring.keep_for = 0.0
+    ring.rotate()
+    old_kid = ring.kid
+    ring.created_at -= 2 * DAY
+    ring.rotate()
+    assert ring.public_key(old_kid) is None
+    reloaded = key_ring(engine)
+    reloaded.load()
+    assert [jwk["kid"] for jwk in reloaded.jwks()["keys"]] == [ring.kid]
@@ -0,0 +1,194 @@
+import shutil
+import subprocess
+import sys
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from log_store import (
+    CorruptLogError,
+    LogStore,
+    StoreLockedError,
+    decode_value,
+    encode_value,
+    segment_name,
+)
+
+
+def open_store(path, **kwargs):
+    # no background compaction, the tests call compact()
+    return LogStore(path, compact_interval=None, **kwargs)
+
+
+def test_second_open_fails_while_the_store_is_open(tmp_path):
+    with open_store(tmp_path) as store:
+        store.put("a", 1)
+        with pytest.raises(StoreLockedError):
+            open_store(tmp_path)
+        assert store.get("a") == 1
+    with open_store(tmp_path) as store:
+        assert store.get("a") == 1
+
+
+def test_other_process_cant_open_the_store(tmp_path):
+    code = (
+        "import sys\n"
+        "from log_store import LogStore, StoreLockedError\n"
+        "try:\n"
+        f"    LogStore({str(tmp_path)!r}, compact_interval=None)\n"
+        "except StoreLockedError:\n"
+        "    sys.exit(3)\n"
+    )
+    with open_store(tmp_path):
+        assert subprocess.run([sys.executable, "-c", code]).returncode == 3
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_torn_tail_is_cut_off(tmp_path):
+    with open_store(tmp_path) as store:
+        store.put("a", 1)
+        store.put("b", {"title": "b"})
+    active = tmp_path / segment_name(1)
+    size = active.stat().st_size
+    # a write that didn't complete: half a record, and later garbage with a bad crc
+    record = active.read_bytes()[-(size // 2) :]
+    with open(active, "ab") as f:
+        f.write(record[: len(record) // 2])
+    with open_store(tmp_path) as store:
+        assert store.get("a") == 1
+        assert store.get("b") == {"title": "b"}
+        assert active.stat().st_size == size
+        store.put("c", 3)
+    with open(active, "ab") as f:
+        f.write(b"\x00" * 4 + record[4:])
+    with open_store(tmp_path) as store:
+        assert dict((key, store.get(key)) for key in store.keys()) == {
+            "a": 1,
+            "b": {"title": "b"},
+            "c": 3,
+        }
+
+
+def test_corrupt_sealed_segment_is_an_error(tmp_path):
+    with open_store(tmp_path, segment_size=64) as store:
+        for i in range(10):
+            store.put(f"key-{i}", i)
+    sealed = tmp_path / segment_name(1)
+    data = bytearray(sealed.read_bytes())
+    data[-1] ^= 0xFF
+    sealed.write_bytes(bytes(data))
+    with pytest.raises(CorruptLogError):
+        open_store(tmp_path)
+
+
+def write_items(store, rounds: int = 5, keys: int = 20) -> dict:
+    # every key overwritten `rounds` times, so most of the records are dead
+    expected = {}
+    for round in range(rounds):
+        for i in range(keys):
+            expected[f"key-{i}"] = {"round": round, "i": i}
+            store.put(f"key-{i}", expected[f"key-{i}"])
+    return expected
+
+
+def test_replay_after_compaction(tmp_path):
+    with open_store(tmp_path, segment_size=256) as store:
+        expected = write_items(store)
+        segments = len(list(tmp_path.glob("*.log")))
+        store.compact()
+        assert len(list(tmp_path.glob("*.log"))) < segments
+        assert {key: store.get(key) for key in store.keys()} == expected
+        store.put("key-0", "after")
+        expected["key-0"] = "after"
+    with open_store(tmp_path, segment_size=256) as store:
+        assert {key: store.get(key) for key in store.keys()} == expected
+        store.compact()
+    with open_store(tmp_path, segment_size=256) as store:
+        assert {key: store.get(key) for key in store.keys()} == expected
+
+
+def test_tombstones_survive_compaction(tmp_path):
+    with open_store(tmp_path, segment_size=256) as store:
+        expected = write_items(store, rounds=2)
+        # deleted in the same sealed segments as the puts
+        assert store.delete("key-1")
+        del expected["key-1"]
+        # bigger than a segment, the ones before it are sealed
+        store.put("filler", "x" * 300)
+        store.compact()
+        # the put of key-2 is in the compacted segment now, the delete in a later one
+        assert store.delete("key-2")
+        del expected["key-2"]
+        store.put("filler", "y" * 300)
+        expected["filler"] = "y" * 300
+        store.compact()
+        # and one that is still in the active segment on the next open
+        assert store.delete("key-3")
+        del expected["key-3"]
+        assert "key-1" not in store and "key-2" not in store and "key-3" not in store
+    with open_store(tmp_path, segment_size=256) as store:
+        assert "key-1" not in store and "key-2" not in store and "key-3" not in store
+        assert {key: store.get(key) for key in store.keys()} == expected
+
+
+def test_interrupted_compaction(tmp_path):
+    with open_store(tmp_path, segment_size=256) as store:
+        # the put and the delete of "gone" are segments apart, the compaction drops both
+        store.put("gone", 1)
+        expected = write_items(store)
+        store.delete("gone")
+        store.put("filler", "x" * 300)
+        expected["filler"] = "x" * 300
+    backup = tmp_path.parent / "backup"
+    shutil.copytree(tmp_path, backup)
+    with open_store(tmp_path, segment_size=256) as store:
+        store.compact()
+    # died after the compacted segment replaced the newest sealed one, before the older ones
+    # were deleted, and with the file of a later compaction half written
+    for segment in backup.glob("*.log"):
+        if not (tmp_path / segment.name).exists():
+            shutil.copy(segment, tmp_path / segment.name)
+    (tmp_path / "000001.compact").write_bytes(b"partial")
+    with open_store(tmp_path, segment_size=256) as store:
+        assert {key: store.get(key) for key in store.keys()} == expected
+        assert "gone" not in store
+    assert not list(tmp_path.glob("*.compact"))
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        None,
+        True,
+        False,
+        0,
+        -(2**31),
+        2**31,
+        2**63,
+        -(2**70),
+        1.5,
+        float("inf"),
+        "",
+        "é" * 300,
+        b"\x00",
+        b"y" * 300,
+        [1, [2, "three"], None],
+        list(range(300)),
+        {f"key-{i}": i for i in range(300)},
+        {"title": "Foo", "timestamp": datetime(2025, 1, 2, 3, 4, 5), "description": None},
+        datetime(2025, 1, 2, 3, 4, 5, 6),
+        datetime(1, 1, 1),
+        datetime(9999, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc),
+        datetime(2025, 1, 2, 3, 4, 5, 6, tzinfo=timezone(timedelta(hours=5, minutes=30))),
+        datetime(1969, 12, 31, 23, 59, 59, 999999, tzinfo=timezone(timedelta(hours=-8))),
+        date(1, 1, 1),
+        date(9999, 12, 31),
+    ],
+)
+def test_encode_decode_round_trip(value):
+    decoded = decode_value(encode_value(value))
+    assert decoded == value
+    assert type(decoded) is type(value)
+    if isinstance(value, datetime):
+        # the same instant is not enough, the offset comes back too
+        assert decoded.utcoffset() == value.utcoffset()
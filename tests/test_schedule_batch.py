@@ -0,0 +1,66 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks._common import load_notebook
+
+extra = load_notebook("12_extra_data_types")
+client = TestClient(extra.app)
+
+ITEM_ID = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+
+
+def batch(process_after, start_datetime="2025-01-01T00:00:00Z") -> str:
+    # raw json, so NaN and Infinity can be sent
+    return (
+        f'{{"item_id": ["{ITEM_ID}"], "start_datetime": ["{start_datetime}"], '
+        f'"end_datetime": ["2025-01-02T00:00:00Z"], "process_after": [{process_after}]}}'
+    )
+
+
+def post(body: str):
+    return client.post("/items/batch", content=body, headers={"Content-Type": "application/json"})
+
+
+def test_schedule():
+    response = post(batch(3600))
+    assert response.status_code == 200
+    assert response.json() == {
+        "item_id": [ITEM_ID],
+        "start_process": ["2025-01-01T01:00:00.000000Z"],
+        "duration": [82800.0],
+    }
+
+
+@pytest.mark.parametrize("process_after", ["1e300", "-1e300", "NaN", "Infinity", "-Infinity"])
+def test_process_after_out_of_range(process_after):
+    assert post(batch(process_after)).status_code == 422
+
+
+def test_process_after_at_the_limit():
+    response = post(batch(-extra.MAX_PROCESS_AFTER, start_datetime="0001-01-01T00:00:00"))
+    assert response.status_code == 200
+    assert "NaT" not in response.json()["start_process"][0]
+
+
+@pytest.mark.parametrize("start_datetime", ["300000-01-01T00:00:00", "+2025-01-01", "NaT"])
+def test_year_not_4_digits(start_datetime):
+    assert post(batch(0, start_datetime=start_datetime)).status_code == 422
+
+
+@pytest.mark.parametrize(
+    "start_datetime",
+    [
+        "2025-01-01T00:00:00+99:99",
+        "2025-01-01T00:00:00+24:00",
+        "2025-01-01T00:00:00-02:60",
+        "2025-01-01T00:00:00+02:00Z",
+    ],
+)
+def test_invalid_utc_offset(start_datetime):
+    assert post(batch(0, start_datetime=start_datetime)).status_code == 422
+
+
+def test_utc_offset_at_the_limit():
+    response = post(batch(0, start_datetime="2025-01-02T00:00:00+23:59"))
+    assert response.status_code == 200
+    assert response.json()["start_process"] == ["2025-01-01T00:01:00.000000Z"]
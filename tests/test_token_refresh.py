@@ -0,0 +1,79 @@
+import asyncio
+import importlib
+import secrets
+import threading
+import time
+
+import httpx
+import pytest
+
+from benchmarks._common import use_users_db
+
+auth = importlib.import_module("38_oauth2_with_password_and_hashing_bearer_with_jwt_tokens")
+
+login_form = {"username": "johndoe", "password": "secret"}
+
+
+@pytest.fixture
+def client(tmp_path):
+    use_users_db(auth, tmp_path / "users.db")
+
+    async def make_client():
+        transport = httpx.ASGITransport(app=auth.app)
+        return httpx.AsyncClient(transport=transport, base_url="http://test")
+
+    yield make_client
+    auth.engine.dispose()
+
+
+async def refresh(client, token: str) -> int:
+    response = await client.post("/token/refresh", data={"refresh_token": token})
+    return response.status_code
+
+
+def test_refresh_token_is_redeemed_once(client):
+    async def run():
+        async with await client() as c:
+            tokens = (await c.post("/token", data=login_form)).json()
+            return await asyncio.gather(*(refresh(c, tokens["refresh_token"]) for _ in range(5)))
+
+    assert sorted(asyncio.run(run())) == [200, 401, 401, 401, 401]
+
+
+def test_refresh_token_used_in_another_worker(client):
+    async def run():
+        async with await client() as c:
+            tokens = (await c.post("/token", data=login_form)).json()
+            first = await refresh(c, tokens["refresh_token"])
+            # another worker: its own filter, the same table
+            auth.revocation_list = auth.RevocationList(
+                auth.engine, capacity=auth.REVOCATION_CAPACITY, error_rate=auth.REVOCATION_ERROR_RATE
+            )
+            return first, await refresh(c, tokens["refresh_token"])
+
+    assert asyncio.run(run()) == (200, 401)
+
+
+def test_checks_during_rebuilds(client):
+    revocation_list = auth.RevocationList(auth.engine, capacity=4, error_rate=0.01)
+    revoked = [secrets.token_urlsafe(16) for _ in range(200)]
+    errors = []
+    done = threading.Event()
+
+    def check():
+        while not done.is_set():
+            try:
+                if not revocation_list._maybe_revoked(revoked[0]):
+                    errors.append("revoked jti missed")
+            except Exception as e:
+                errors.append(e)
+
+    revocation_list.revoke(revoked[0], time.time() + 60)
+    checker = threading.Thread(target=check)
+    checker.start()
+    for jti in revoked[1:]:
+        revocation_list.revoke(jti, time.time() + 60)
+    done.set()
+    checker.join()
+    assert errors == []
+    assert revocation_list.capacity >= 200
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine, update
+
+import user_repository
+from user_repository import UserInDB, UserRepository, UserRow
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'users.db'}", connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(UserRow(username="bob", hashed_password="hash"))
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def test_load_racing_disable_doesnt_cache_the_old_row(engine, monkeypatch):
+    repository = UserRepository(engine, maxsize=10, ttl=60.0)
+    read, go = threading.Event(), threading.Event()
+    validate = UserInDB.model_validate
+    calls = []
+
+    class PausingUserInDB(UserInDB):
+        @classmethod
+        def model_validate(cls, *args, **kwargs):
+            # the first load stops between its select and putting the user in the cache
+            calls.append(1)
+            if len(calls) == 1:
+                read.set()
+                go.wait()
+            return validate(*args, **kwargs)
+
+    monkeypatch.setattr(user_repository, "UserInDB", PausingUserInDB)
+    loader = threading.Thread(target=repository.get, args=("bob",))
+    loader.start()
+    read.wait()
+    repository.disable("bob")
+    go.set()
+    loader.join()
+    assert repository.get("bob").disabled
+
+
+def test_change_from_another_worker_is_seen_after_the_ttl(engine):
+    repository = UserRepository(engine, maxsize=10, ttl=0.05)
+    assert not repository.get("bob").disabled
+    with Session(engine) as session:
+        session.exec(update(UserRow).where(UserRow.username == "bob").values(disabled=True))
+        session.commit()
+    assert not repository.get("bob").disabled
+    time.sleep(0.1)
+    assert repository.get("bob").disabled
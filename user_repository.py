@@ -0,0 +1,119 @@
+import threading
+import time
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+from sqlmodel import Field, Session, SQLModel, select, update
+
+# users table and repository, shared by the security tutorials (37_*.py, 38_*.py)
+
+
+class User(BaseModel):
+    username: str
+    email: str | None = None
+    full_name: str | None = None
+    disabled: bool | None = None
+
+
+class UserInDB(User):
+    hashed_password: str
+
+
+# the users live in a sqlite table with a unique index on username
+class UserRow(SQLModel, table=True):
+    __tablename__ = "users"
+
+    id: int | None = Field(default=None, primary_key=True)
+    username: str = Field(unique=True, index=True)
+    email: str | None = None
+    full_name: str | None = None
+    hashed_password: str
+    disabled: bool = False
+
+
+# user repository
+# every authenticated request needs the user behind the token. the repository reads the row once
+# and keeps the built UserInDB in a bounded LRU (read-through), so the hot path is a dict lookup
+# with no query and no validation. update() and disable() write the row and drop the cached
+# user, the next request reads it again.
+# the cache is per process: with several workers, a change made through one of them is only
+# seen by the others once the entry expires, so an entry lives at most `ttl` seconds.
+# a miss that reads the row while update() or disable() runs could put the old user back after
+# their invalidate(), so the entry is only stored if nothing was invalidated since the read
+# started (the generation guard of LRUCache in 42_sql_relational_databases.py).
+# the async endpoints use get_async(): a cached user is returned right away, only a miss queries
+# the table, in the threadpool instead of on the event loop.
+
+
+class UserRepository:
+    def __init__(self, engine, maxsize: int, ttl: float):
+        self.engine = engine
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds
+        self.hits = 0
+        self.misses = 0
+        # bumped by every invalidate(), see _load()
+        self.generation = 0
+        self._cache: OrderedDict[str, tuple[float, UserInDB]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, username: str) -> UserInDB | None:
+        with self._lock:
+            item = self._cache.get(username)
+            if item is not None:
+                expires_at, user = item
+                if expires_at > time.monotonic():
+                    self._cache.move_to_end(username)
+                    self.hits += 1
+                    return user
+                del self._cache[username]
+            return None
+
+    def _load(self, username: str) -> UserInDB | None:
+        with self._lock:
+            self.misses += 1
+            generation = self.generation
+        with Session(self.engine) as session:
+            row = session.exec(select(UserRow).where(UserRow.username == username)).first()
+        if row is None:
+            return None
+        user = UserInDB.model_validate(row, from_attributes=True)
+        with self._lock:
+            # something was invalidated while the row was being read, it might already be stale
+            if generation != self.generation:
+                return user
+            self._cache[username] = (time.monotonic() + self.ttl, user)
+            if len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return user
+
+    def get(self, username: str) -> UserInDB | None:
+        user = self._cached(username)
+        return user if user is not None else self._load(username)
+
+    async def get_async(self, username: str) -> UserInDB | None:
+        user = self._cached(username)
+        return user if user is not None else await run_in_threadpool(self._load, username)
+
+    def add(self, user: UserInDB) -> UserInDB:
+        with Session(self.engine) as session:
+            session.add(UserRow.model_validate(user, from_attributes=True))
+            session.commit()
+        return user
+
+    def update(self, username: str, changes: dict) -> UserInDB | None:
+        if changes:
+            with Session(self.engine) as session:
+                session.exec(update(UserRow).where(UserRow.username == username).values(changes))
+                session.commit()
+            self.invalidate(username)
+        return self.get(username)
+
+    def disable(self, username: str) -> UserInDB | None:
+        return self.update(username, {"disabled": True})
+
+    def invalidate(self, username: str):
+        with self._lock:
+            self.generation += 1
+            self._cache.pop(username, None)